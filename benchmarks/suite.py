@@ -0,0 +1,222 @@
+"""
+Benchmarks the dispatch, render and redirect hot paths of Application
+over generated template trees and compares them against a baseline.
+
+Usage: python benchmarks/suite.py [--save] [--threshold 0.25] [--repeat 3]
+
+Every scenario runs in a fresh process, so Django is configured for
+each tree and start-up is measured cold. Timings depend on the machine,
+so the baseline is kept locally; run with --save to record one.
+
+"""
+import json
+import multiprocessing
+import os
+import shutil
+import sys
+import tempfile
+from optparse import OptionParser
+from timeit import default_timer
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baseline.json')
+
+BASE_TEMPLATE = '<html><body>{% block content %}{% endblock %}</body></html>'
+
+
+def flat(template_dir, pages):
+    """
+    A site of independent pages extending one base template.
+
+    """
+    write(template_dir, 'base.html', BASE_TEMPLATE)
+    for i in range(pages):
+        write(template_dir, 'page%d.html' % i,
+              '{%% extends "base.html" %%}{%% block content %%}Page %d{%% endblock %%}' % i)
+    return '/page0/'
+
+
+def deep(template_dir, depth):
+    """
+    A page at the bottom of a chain of depth templates extending each
+    other.
+
+    """
+    write(template_dir, 'level0.html', BASE_TEMPLATE)
+    for i in range(1, depth):
+        write(template_dir, 'level%d.html' % i,
+              '{%% extends "level%d.html" %%}'
+              '{%% block content %%}{{ block.super }}Level %d{%% endblock %%}' % (i - 1, i))
+    return '/level%d/' % (depth - 1)
+
+
+def includes(template_dir, count):
+    """
+    A page including count partials.
+
+    """
+    os.makedirs(os.path.join(template_dir, 'partials'))
+    for i in range(count):
+        write(template_dir, os.path.join('partials', 'partial%d.html' % i),
+              '<section>Partial %d</section>' % i)
+    write(template_dir, 'page.html',
+          ''.join('{%% include "partials/partial%d.html" %%}' % i for i in range(count)))
+    return '/page/'
+
+
+SCENARIOS = [
+    ('flat-10', flat, 10),
+    ('flat-1000', flat, 1000),
+    ('deep-5', deep, 5),
+    ('deep-25', deep, 25),
+    ('includes-10', includes, 10),
+    ('includes-100', includes, 100),
+]
+
+
+def write(template_dir, name, source):
+    with open(os.path.join(template_dir, name), 'w') as f:
+        f.write(source)
+
+
+def measure(func, iterations=200, repeat=5):
+    """
+    Returns the fastest mean time per call of func over repeat runs of
+    iterations calls.
+
+    """
+    best = None
+    for i in range(repeat):
+        start = default_timer()
+        for j in range(iterations):
+            func()
+        mean = (default_timer() - start) / iterations
+        if best is None or mean < best:
+            best = mean
+    return best
+
+
+def run_scenario(generate, size):
+    """
+    Generates a template tree and returns the timings for it. Runs in
+    its own process.
+
+    """
+    template_dir = tempfile.mkdtemp()
+    try:
+        path = generate(template_dir, size)
+
+        start = default_timer()
+        from fugleman.application import Application
+        from werkzeug.exceptions import HTTPException
+        from werkzeug.test import EnvironBuilder
+        from werkzeug.wrappers import Request
+        application = Application(watch=False, TEMPLATE_DIRS=[template_dir])
+        startup = default_timer() - start
+
+        def dispatch(path):
+            environ = EnvironBuilder(path=path).get_environ()
+
+            def call():
+                try:
+                    return application.dispatch(Request(dict(environ)))
+                except HTTPException as e:
+                    return e
+            return call
+
+        start = default_timer()
+        dispatch(path)()
+        first_request = default_timer() - start
+
+        return {
+            'startup': startup,
+            'first_request': first_request,
+            'hit': measure(dispatch(path)),
+            'render': measure(lambda: application.render(path), iterations=20),
+            'redirect': measure(dispatch(path.rstrip('/'))),
+            'not_found': measure(dispatch('/missing/')),
+        }
+    finally:
+        shutil.rmtree(template_dir)
+
+
+def run(repeat=3):
+    """
+    Runs every scenario repeat times, each in a new process, and returns
+    the fastest timing of each metric.
+
+    """
+    results = {}
+    for name, generate, size in SCENARIOS:
+        for i in range(repeat):
+            pool = multiprocessing.Pool(1)
+            try:
+                metrics = pool.apply(run_scenario, (generate, size))
+            finally:
+                pool.close()
+                pool.join()
+            best = results.setdefault(name, metrics)
+            for metric, value in metrics.items():
+                best[metric] = min(best[metric], value)
+    return results
+
+
+def compare(results, baseline, threshold):
+    """
+    Returns a list of (scenario, metric, baseline, result) tuples for the
+    timings that are more than threshold slower than the baseline.
+
+    """
+    regressions = []
+    for name, metrics in sorted(results.items()):
+        for metric, value in sorted(metrics.items()):
+            expected = baseline.get(name, {}).get(metric)
+            if expected is not None and value > expected * (1 + threshold):
+                regressions.append((name, metric, expected, value))
+    return regressions
+
+
+def main():
+    parser = OptionParser(usage='%prog [options]')
+    parser.add_option('--save', action='store_true', default=False,
+                      help='Store the results as the new baseline.')
+    parser.add_option('--baseline', default=BASELINE, metavar='PATH',
+                      help='The baseline file. Defaults to benchmarks/baseline.json.')
+    parser.add_option('--threshold', type='float', default=0.25,
+                      help='How much slower than the baseline a timing may be. '
+                           'Defaults to 0.25 (25%).')
+    parser.add_option('--repeat', type='int', default=3,
+                      help='How many processes to run each scenario in, the '
+                           'fastest timings are kept. Defaults to 3.')
+    options, args = parser.parse_args()
+
+    results = run(options.repeat)
+    for name, generate, size in SCENARIOS:
+        metrics = results[name]
+        sys.stdout.write('%-14s %s\n' % (name, '  '.join(
+            '%s=%.3fms' % (metric, metrics[metric] * 1000) for metric in sorted(metrics))))
+
+    if options.save:
+        with open(options.baseline, 'w') as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+        sys.stdout.write('Saved the baseline to %s.\n' % options.baseline)
+        return 0
+
+    try:
+        with open(options.baseline) as f:
+            baseline = json.load(f)
+    except IOError:
+        sys.stdout.write('No baseline found, run with --save to record one.\n')
+        return 0
+
+    regressions = compare(results, baseline, options.threshold)
+    for name, metric, expected, value in regressions:
+        sys.stdout.write('REGRESSION %s %s: %.3fms -> %.3fms (+%d%%)\n' % (
+            name, metric, expected * 1000, value * 1000, (value / expected - 1) * 100))
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,4 +1,65 @@
+"""
+Fugleman serves web prototypes from Django templates.
+
+`Application` and `Sites` are imported from their modules the first
+time they're used, so the command line tools don't import Django and
+Werkzeug until a command needs them.
+
+"""
+import sys
+from types import ModuleType
+
+
 __version__ = '0.1'
 
 
-from fugleman.application import Application
+all_by_module = {
+    'fugleman.application': ['Application'],
+    'fugleman.sites': ['Sites'],
+}
+
+object_origins = {}
+for module_name, names in all_by_module.items():
+    for name in names:
+        object_origins[name] = module_name
+
+
+class module(ModuleType):
+    """
+    The fugleman package, which imports its attributes on first access.
+
+    Python 2 has no module level `__getattr__`, so this replaces the
+    package in sys.modules the way Werkzeug's own package does.
+
+    """
+
+    def __getattr__(self, name):
+        if name in object_origins:
+            module = __import__(object_origins[name], None, None, [name])
+            for extra_name in all_by_module[module.__name__]:
+                setattr(self, extra_name, getattr(module, extra_name))
+        return ModuleType.__getattribute__(self, name)
+
+    def __dir__(self):
+        result = list(new_module.__all__)
+        result.extend(('__file__', '__path__', '__doc__', '__all__', '__name__',
+                       '__package__', '__version__'))
+        return result
+
+
+# Keeps this module alive, on Python 2 its globals would otherwise be set
+# to None once it's replaced.
+old_module = sys.modules['fugleman']
+
+new_module = sys.modules['fugleman'] = module('fugleman')
+new_module.__dict__.update({
+    '__file__': __file__,
+    '__package__': 'fugleman',
+    '__path__': __path__,
+    '__doc__': __doc__,
+    '__version__': __version__,
+    '__all__': tuple(object_origins),
+})
+for name in ('__loader__', '__spec__'):
+    if name in globals():
+        new_module.__dict__[name] = globals()[name]
@@ -0,0 +1,150 @@
+import atexit
+import json
+import os
+import random
+import sys
+import threading
+import time
+
+try:
+    from Queue import Empty, Full, Queue
+except ImportError:
+    from queue import Empty, Full, Queue
+
+
+class AccessLog(object):
+    """
+    Writes a JSON line for every request to filename, or to stdout.
+
+    Requests only put their record on a bounded queue, a background
+    thread writes them in batches of up to batch_size, waiting at most
+    flush_interval seconds to fill one. When the queue is full because
+    the file can't keep up, records are dropped rather than making the
+    request wait, and the number dropped is logged.
+
+    `sample` maps path prefixes to the fraction of their requests to
+    log, like `{'/static/': 0.01}`. Sampled records have a `sample`
+    key, and server errors are always logged.
+
+    The thread is started by the first request in each process, so a
+    log created before the server forks works in every worker.
+
+    """
+
+    def __init__(self, filename=None, stream=None, sample=None, max_size=10000, batch_size=512,
+                 flush_interval=1.0):
+        self.filename = filename
+        self.stream = stream
+        self.sample = sorted((sample or {}).items(), key=lambda item: -len(item[0]))
+        self.max_size = max_size
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.dropped = 0
+        self.queue = None
+        self._pid = None
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def sample_rate(self, path):
+        for prefix, rate in self.sample:
+            if path.startswith(prefix):
+                return rate
+        return 1.0
+
+    def log(self, record):
+        """
+        Queues record, a dict, to be written unless it's sampled out or
+        the queue is full.
+
+        """
+        rate = self.sample_rate(record.get('path', ''))
+        if rate < 1.0 and (record.get('status') or 0) < 500:
+            if random.random() >= rate:
+                return
+            record['sample'] = rate
+        if self._pid != os.getpid():
+            self.start()
+        try:
+            self.queue.put_nowait(record)
+        except Full:
+            self.dropped += 1
+
+    def start(self):
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            # Threads and their queues don't survive a fork.
+            self.queue = Queue(self.max_size)
+            self._thread = threading.Thread(target=self.run, args=(self.queue,))
+            self._thread.daemon = True
+            self._thread.start()
+            if self._pid is None:
+                atexit.register(self.close)
+            self._pid = os.getpid()
+
+    def close(self, timeout=5.0):
+        """
+        Writes the queued records and stops the thread.
+
+        """
+        if self._pid != os.getpid():
+            return
+        self.queue.put(None)
+        self._thread.join(timeout)
+        self._pid = None
+
+    def open(self):
+        if self.stream is not None:
+            return self.stream
+        if self.filename is None:
+            return sys.stdout
+        return open(self.filename, 'a')
+
+    def run(self, queue):
+        stream = self.open()
+        running = True
+        while running:
+            batch = [queue.get()]
+            deadline = time.time() + self.flush_interval
+            while batch[-1] is not None and len(batch) < self.batch_size:
+                remaining = deadline - time.time()
+                try:
+                    if remaining > 0:
+                        batch.append(queue.get(timeout=remaining))
+                    else:
+                        batch.append(queue.get_nowait())
+                except Empty:
+                    break
+            if batch[-1] is None:
+                running = False
+                batch.pop()
+            self.write(stream, batch)
+        if stream is not sys.stdout and stream is not self.stream:
+            stream.close()
+
+    def write(self, stream, records):
+        dropped, self.dropped = self.dropped, 0
+        if dropped:
+            records.append({'time': round(time.time(), 3), 'dropped': dropped})
+        if not records:
+            return
+        lines = ''.join('%s\n' % json.dumps(record, sort_keys=True, separators=(',', ':'))
+                        for record in records)
+        try:
+            # One write and flush per batch rather than per request.
+            stream.write(lines)
+            stream.flush()
+        except (IOError, OSError, ValueError):
+            self.dropped += len(records)
+
+
+def has_access_log(application):
+    """
+    Returns True if application, or any application of a Sites, keeps an
+    access log.
+
+    """
+    applications = getattr(application, 'applications', None)
+    if applications is None:
+        applications = [application]
+    return any(getattr(application, 'access_log', None) is not None for application in applications)
@@ -1,26 +1,638 @@
 import os
+import time
+import warnings
+from datetime import datetime
 
 from django.conf import settings
-from django.template.loader import render_to_string
+from django.template import Context, TemplateDoesNotExist
+from werkzeug.exceptions import HTTPException, NotFound
+from werkzeug.http import is_resource_modified
 from werkzeug.utils import redirect
 from werkzeug.wrappers import Request, Response
+from werkzeug.wsgi import ClosingIterator
+
+from fugleman import compression, minify, streaming, templates
+from fugleman.cache import Page, PageCache, SharedPageCache, last_modified
+from fugleman.data import DataStore
+from fugleman.engine import Engine
+from fugleman.static import StaticFiles
+from fugleman.stats import NULL_TIMINGS, Stats, Timings
+from fugleman.watcher import create_watcher
+
+
+class PageResponse(Response):
+    default_mimetype = 'text/html'
 
 
 class Application(object):
+    """
+    Serves the templates in template_dirs as pages.
+
+    Django settings are process wide, so the keyword arguments only
+    configure them for the first application created, later ones warn
+    that theirs are ignored. Each application has its own template dirs
+    and template engine, so any number of them can be served from one
+    process.
+
+    """
+    not_found_template = '404.html'
 
-    def __init__(self, **kwargs):
-        settings.configure(**kwargs)
+    def __init__(self, template_dirs=None, cache_size=128, watch=True, watch_interval=1.0, compress=True,
+                 compress_min_size=1024, static_dir=None, static_url='/static/',
+                 server_timing=False, stats_url=None, stream=False, stream_chunk_size=64 * 1024,
+                 stream_cache_limit=1024 * 1024, warmup=False, data_dir=None,
+                 fragment_cache_size=1024, minify=False, fingerprint=True, access_log=None,
+                 cache_file=None, cache_file_size=64 * 1024 * 1024, **kwargs):
+        if template_dirs is None:
+            template_dirs = kwargs.pop('TEMPLATE_DIRS', ())
+        if 'TEMPLATE_LOADERS' in kwargs:
+            raise ValueError("TEMPLATE_LOADERS can't be set, fugleman loads the templates itself.")
+        if settings.configured:
+            if kwargs:
+                warnings.warn("Django settings are already configured, ignoring %s." %
+                              ', '.join(sorted(kwargs)))
+        else:
+            kwargs['TEMPLATE_LOADERS'] = ('fugleman.engine.Loader',)
+            # Makes fugleman's template tags available to `{% load %}`.
+            installed_apps = list(kwargs.get('INSTALLED_APPS', ()))
+            if 'fugleman' not in installed_apps:
+                kwargs['INSTALLED_APPS'] = installed_apps + ['fugleman']
+            settings.configure(**kwargs)
+        self.stream = stream
+        self.stream_chunk_size = stream_chunk_size
+        self.stream_cache_limit = stream_cache_limit
+        self.server_timing = server_timing
+        self.stats_url = stats_url
+        self.stats = Stats()
+        self.access_log = access_log
+        if static_dir is not None:
+            self.static = StaticFiles(static_dir, static_url, fingerprint=fingerprint)
+        else:
+            self.static = None
+        self.minify = minify
+        self.compress = compress
+        self.compress_min_size = compress_min_size
+        self.template_dirs = list(template_dirs)
+        if data_dir is not None:
+            self.data = DataStore(data_dir)
+        else:
+            self.data = None
+        # Compiled templates are kept unless debugging, the watcher and
+        # expire_templates throw them away when they change.
+        self.engine = Engine(self.template_dirs, cached=not settings.DEBUG,
+                             fragment_cache_size=fragment_cache_size, static=self.static)
+        # The watcher invalidates changed pages so hits needn't check.
+        if cache_file is not None:
+            # Shared by every worker process serving from the same file.
+            self.cache = SharedPageCache(cache_file, cache_size, cache_file_size,
+                                         check_stale=not watch)
+        else:
+            self.cache = PageCache(cache_size, check_stale=not watch)
+        self.routes = templates.RouteIndex(self.template_dirs)
+        if warmup:
+            self.warmup()
+        if watch:
+            self.watcher = create_watcher(self.watched_dirs, self.templates_changed, watch_interval)
+            self.watcher.start()
+        else:
+            self.watcher = None
+
+    @property
+    def watched_dirs(self):
+        dirs = list(self.template_dirs)
+        if self.data is not None:
+            dirs.append(self.data.root)
+        if self.static is not None and self.static.manifest is not None:
+            dirs.append(self.static.root)
+        return dirs
+
+    @property
+    def timed(self):
+        return self.server_timing or self.stats_url is not None or self.access_log is not None
 
     def __call__(self, environ, start_response):
-        request = Request(environ)
-        response = self.dispatch(request)
+        request = self.make_request(environ)
+        try:
+            response = self.dispatch(request)
+        except HTTPException as e:
+            response = e.get_response(environ)
+        self.finish_response(request, response)
         return response(environ, start_response)
 
+    def make_request(self, environ):
+        request = Request(environ)
+        request.timings = Timings() if self.timed else NULL_TIMINGS
+        # Whether the page came from the cache, for the access log.
+        request.cache_status = None
+        # Whether the page is rendered as the response is sent.
+        request.streamed = False
+        return request
+
+    def log_access(self, request, response):
+        """
+        Logs request to the access log, once the body has been sent if
+        its length isn't known up front.
+
+        """
+        def log(length):
+            timings = request.timings
+            self.access_log.log({
+                'time': round(time.time(), 3),
+                'method': request.method,
+                'path': request.path,
+                'status': response.status_code,
+                'cache': request.cache_status,
+                'bytes': length,
+                'duration': round(timings.total * 1000, 3),
+                'render': round(timings.phases.get('render', 0.0) * 1000, 3),
+            })
+
+        length = response.headers.get('Content-Length', type=int)
+        if length is None and response.is_sequence:
+            length = sum(len(chunk) for chunk in response.response)
+        if length is None and (request.method == 'HEAD' or response.status_code in (204, 304)):
+            # Werkzeug sends no body for these and never closes it.
+            length = 0
+        if length is not None:
+            log(length)
+            return
+
+        sent = [0]
+
+        def count(iterable):
+            for chunk in iterable:
+                sent[0] += len(chunk)
+                yield chunk
+
+        self.call_on_close(response, lambda: log(sent[0]), count)
+
+    def call_on_close(self, response, callback, wrap=None):
+        """
+        Calls callback once response has been sent, after the close of
+        its body. The body is passed through wrap first if it's given.
+
+        Closing the response closes its body, so callback is called
+        whether or not the response passes its body straight through.
+
+        """
+        body = response.response
+        callbacks = [callback]
+        if hasattr(body, 'close'):
+            callbacks.insert(0, body.close)
+        response.response = ClosingIterator(wrap(body) if wrap else body, callbacks)
+
+    def finish_response(self, request, response):
+        """
+        Records the timings of a handled request, and logs it if there's
+        an access log.
+
+        Streamed pages are rendered as they're sent, so their render
+        phase, which includes sending them, and their total are recorded
+        once the response is closed. Their Server-Timing header goes out
+        before the page so it has no render phase.
+
+        """
+        timings = request.timings
+        timings.mark('encode')
+        timed = self.timed and request.path != self.stats_url
+        if timed and self.server_timing and isinstance(response, Response):
+            response.headers['Server-Timing'] = timings.server_timing()
+        if request.streamed and request.method != 'HEAD':
+            def rendered():
+                timings.mark('render')
+                if timed and self.stats_url is not None:
+                    self.stats.record(timings)
+            self.call_on_close(response, rendered)
+        elif timed and self.stats_url is not None:
+            self.stats.record(timings)
+        if self.access_log is not None:
+            self.log_access(request, response)
+
     def dispatch(self, request):
-        if not request.path.endswith('/'):
-            return redirect('%s/' % request.path)
-        return Response(self.render(request.path))
+        response = self.respond(request)
+        if response is None:
+            request.cache_status = 'miss'
+            response = self.render_response(request)
+        return response
+
+    def respond(self, request):
+        """
+        Returns the response for request if it can be answered without
+        rendering the page, otherwise None.
+
+        """
+        timings = getattr(request, 'timings', NULL_TIMINGS)
+        path = request.path
+        timings.mark('parse')
+
+        if self.watcher is None and self.static is not None and self.static.manifest is not None:
+            # Nothing else notices the static files changing.
+            if self.static.manifest.poll():
+                self.assets_changed()
+
+        if self.stats_url is not None and path == self.stats_url:
+            return Response(self.stats.render(self.cache), mimetype='text/plain')
+        if self.static is not None and path.startswith(self.static.url):
+            response = self.static.serve(request)
+            if response is None:
+                return self.not_found(request.script_root)
+            return response
+        if not path.endswith('/'):
+            if not self.has_route('%s/' % path):
+                return self.not_found(request.script_root)
+            return redirect('%s%s/' % (request.script_root, path))
+        if not self.has_route(path):
+            return self.not_found(request.script_root)
+        page = self.cache.get(path)
+        timings.mark('resolve')
+        if page is None:
+            return self.not_modified(request)
+        request.cache_status = 'hit'
+        return self.page_response(request, page)
+
+    def has_route(self, path):
+        """
+        Returns whether a template serves path.
+
+        Without a watcher nothing notices templates being added, so a
+        miss rebuilds the route index, at most once a second.
+
+        """
+        if path in self.routes:
+            return True
+        if self.watcher is None and self.routes.poll():
+            return path in self.routes
+        return False
+
+    def render_response(self, request):
+        """
+        Renders and caches the page for request and returns a response
+        for it.
+
+        """
+        if self.stream:
+            return self.stream_response(request)
+        timings = getattr(request, 'timings', NULL_TIMINGS)
+        try:
+            page = self.render_page(request.path, timings, request.script_root)
+        except (IOError, TemplateDoesNotExist):
+            # The template was removed since the index was built.
+            self.routes.refresh()
+            return self.not_found(request.script_root)
+        self.cache.set(request.path, page)
+        return self.page_response(request, page)
+
+    def stream_response(self, request):
+        """
+        Returns a response that renders the page for request as it's
+        sent, caching it afterwards if it's no larger than
+        stream_cache_limit.
+
+        Streamed responses have no ETag or Content-Length since neither
+        is known until the page is rendered, and an error partway
+        through cuts the response short.
+
+        """
+        timings = getattr(request, 'timings', NULL_TIMINGS)
+        route = self.routes.get(request.path)
+        if route is None:
+            return self.not_found(request.script_root)
+        dependencies = self.dependencies(request.path)
+        self.expire_templates(route[0], dependencies)
+        timings.mark('resolve')
+        try:
+            template = self.load_template(route[0])
+        except (IOError, TemplateDoesNotExist):
+            self.routes.refresh()
+            return self.not_found(request.script_root)
+        timings.mark('load')
+
+        chunks = self.stream_page(request.path, template, dependencies, request.script_root)
+        headers = {}
+        if self.compress:
+            headers['Vary'] = 'Accept-Encoding'
+            encoding = compression.negotiate(request)
+            if encoding is not None:
+                chunks = compression.compress_stream(chunks, encoding)
+                headers['Content-Encoding'] = encoding
+        response = PageResponse(chunks, headers=headers)
+        response.last_modified = self.page_modified(last_modified(dependencies))
+        request.streamed = True
+        return response
+
+    def stream_page(self, path, template, dependencies, script_root=''):
+        """
+        Yields the rendered page in chunks of about stream_chunk_size
+        bytes, keeping a copy to cache as long as it's small enough.
+
+        """
+        chunks = []
+        size = 0
+        rendered = streaming.iter_render(template, Context(self.context(path, script_root)))
+        for chunk in self.engine.iter_activated(
+                streaming.iter_encoded(rendered, self.stream_chunk_size)):
+            if chunks is not None:
+                size += len(chunk)
+                if size > self.stream_cache_limit:
+                    chunks = None
+                else:
+                    chunks.append(chunk)
+            yield chunk
+        if chunks is not None:
+            self.cache.set(path, Page(b''.join(chunks), dependencies))
+
+    def page_response(self, request, page):
+        """
+        Returns a response for page that answers conditional requests
+        with a 304 Not Modified.
+
+        """
+        content = page.content
+        etag = page.etag
+        headers = {}
+        if self.compress and len(page.content) >= self.compress_min_size:
+            headers['Vary'] = 'Accept-Encoding'
+            encoding = compression.negotiate(request)
+            if encoding is not None:
+                content = page.encode(encoding)
+                etag = '%s-%s' % (etag, encoding)
+                headers['Content-Encoding'] = encoding
+        response = PageResponse(content, headers=headers)
+        response.set_etag(etag)
+        response.last_modified = self.page_modified(page.last_modified)
+        return response.make_conditional(request)
 
-    def render(self, path):
+    def page_modified(self, modified):
+        """
+        Returns modified, the time a page's templates and data last
+        changed, or the time the fingerprints of the static files it may
+        link to last changed if that's later.
+
+        """
+        if modified is None or self.static is None or self.static.manifest is None:
+            return modified
+        return max(modified, datetime.utcfromtimestamp(int(self.static.manifest.modified)))
+
+    def not_modified(self, request):
+        """
+        Returns a 304 response if the client's If-Modified-Since is newer
+        than the page's templates, without rendering the page.
+
+        Requests with an If-None-Match need the rendered page's ETag so
+        they aren't answered here.
+
+        """
+        if request.if_none_match or request.if_modified_since is None:
+            return None
+        modified = self.page_modified(last_modified(self.dependencies(request.path)))
+        if modified is None or is_resource_modified(request.environ, last_modified=modified):
+            return None
+        response = PageResponse(status=304)
+        response.last_modified = modified
+        return response
+
+    def not_found(self, script_root=''):
+        """
+        Returns a 404 response rendered from the 404.html template, or
+        werkzeug's default one if the template dirs don't have it.
+
+        The rendered template is cached, so unknown paths cost no more
+        than a dict lookup.
+
+        """
+        page = self.cache.get(self.not_found_template)
+        if page is None:
+            filename = self.routes.find(self.not_found_template)
+            if filename is None:
+                raise NotFound()
+            dependencies = self.not_found_dependencies()
+            self.expire_templates(self.not_found_template, dependencies)
+            content = self.render_template(self.not_found_template,
+                                           context=self.context(script_root=script_root))
+            content = self.postprocess(content)
+            page = Page(content.encode('utf-8'), dependencies)
+            self.cache.set(self.not_found_template, page)
+        return PageResponse(page.content, status=404)
+
+    def post_fork(self):
+        """
+        Called by the production server in each worker process after it
+        forks. Threads don't survive a fork, so the watcher is restarted.
+
+        """
+        if self.watcher is not None:
+            self.watcher.stop()
+            self.watcher = create_watcher(self.watched_dirs, self.templates_changed,
+                                          self.watcher.interval)
+            self.watcher.start()
+
+    def templates_changed(self, filenames):
+        """
+        Called by the watcher with the template files that were added,
+        changed or removed.
+
+        Only the pages built from those templates, or that a new template
+        now shadows, are removed from the cache, along with their
+        compiled templates.
+
+        """
+        self.routes.refresh()
+        changed = set(os.path.abspath(filename) for filename in filenames)
+        if self.static is not None and self.static.manifest is not None:
+            assets = [filename for filename in changed
+                      if filename.startswith(self.static.root + os.sep)]
+            if assets:
+                if self.static.manifest.update(assets):
+                    self.assets_changed()
+                changed.difference_update(assets)
+        names = set()
+        paths = set()
+        for filename in changed:
+            name = templates.template_name(filename, self.template_dirs)
+            if name is not None:
+                names.add(name)
+                if name.endswith('.html'):
+                    paths.add(templates.template_path(name))
+            elif self.data is not None:
+                if self.data.is_global(filename):
+                    # Every page uses the global data.
+                    self.cache.invalidate(lambda key, page: True)
+                    return
+                path = self.data.page_path(filename)
+                if path is not None:
+                    paths.add(path)
+        if not names and not paths:
+            return
+
+        def affected(name):
+            # A changed directory affects every template inside it.
+            if name is None:
+                return False
+            return name in names or any(name.startswith('%s/' % n) for n in names)
+
+        def is_affected(key, page):
+            if key in paths:
+                return True
+            for filename in page.dependencies:
+                if filename in changed or affected(templates.template_name(filename, self.template_dirs)):
+                    return True
+            return False
+
+        forget = set(names)
+        for page in self.cache.invalidate(is_affected):
+            for filename in page.dependencies:
+                forget.add(templates.template_name(filename, self.template_dirs))
+        self.engine.forget(forget)
+
+    def assets_changed(self):
+        # Pages and fragments link to the old fingerprints.
+        self.cache.invalidate(lambda key, page: True)
+        self.engine.fragments.clear()
+
+    def template_names(self, path):
+        """
+        Returns the names of the templates that can serve path, in the
+        order they are tried.
+
+        """
         path = path[1:-1]
-        return render_to_string(['%s.html' % path, os.path.join(path, 'index.html')])
+        return ['%s.html' % path, os.path.join(path, 'index.html')]
+
+    def render(self, path, timings=NULL_TIMINGS, script_root=''):
+        route = self.routes.get(path)
+        if route is None:
+            raise TemplateDoesNotExist(', '.join(self.template_names(path)))
+        return self.render_template(route[0], timings, self.context(path, script_root))
+
+    def load_template(self, name):
+        # The routes mirror the engine's lookup order, so name loads the
+        # template the route was found at.
+        return self.engine.get_template(name)
+
+    def render_template(self, name, timings=NULL_TIMINGS, context=None):
+        template = self.load_template(name)
+        timings.mark('load')
+        with self.engine.activated():
+            content = template.render(Context(context))
+        timings.mark('render')
+        return content
+
+    def expire_templates(self, name, dependencies):
+        """
+        Forgets the compiled template name and the templates it's built
+        from if any of them changed or were removed since they were
+        compiled, so they're loaded again from disk.
+
+        """
+        sources = {}
+        for filename, mtime in dependencies.items():
+            template_name = templates.template_name(filename, self.template_dirs)
+            if template_name is not None:
+                sources[template_name] = (filename, mtime)
+        stale = name not in sources
+        for template_name, source in sources.items():
+            compiled = self.engine.sources.get(template_name)
+            if compiled is not None and compiled != source:
+                stale = True
+        if stale:
+            # Included templates are compiled into the ones including
+            # them, so they all go.
+            self.engine.forget(set(sources) | set([name]))
+
+    def warmup(self):
+        """
+        Compiles every template in the template dirs ahead of time, so
+        the first request to a page doesn't pay for it.
+
+        Returns the number of templates compiled and how long it took.
+
+        """
+        start = time.time()
+        names = set()
+        for template_dir in self.template_dirs:
+            for root, dirnames, filenames in os.walk(template_dir):
+                for filename in filenames:
+                    if filename.endswith('.html'):
+                        names.add(templates.template_name(os.path.join(root, filename),
+                                                          self.template_dirs))
+        count = 0
+        for name in sorted(names):
+            try:
+                self.engine.get_template(name)
+            except Exception:
+                continue  # The error is shown when the page is requested
+            count += 1
+        return count, time.time() - start
+
+    def context(self, path=None, script_root=''):
+        """
+        Returns the template context for path from the data files, or for
+        pages with no path of their own, like the 404 page, just the
+        global data.
+
+        `script_root` is the prefix the application is served under,
+        which `{% asset %}` tags put in front of their URLs.
+
+        """
+        if self.data is None:
+            context = {}
+        else:
+            context = self.data.context(path)
+        context['script_root'] = script_root
+        return context
+
+    def data_dependencies(self, path=None):
+        dependencies = {}
+        if self.data is not None:
+            filenames = self.data.global_files()
+            if path is not None:
+                filenames = self.data.files(path)
+            for filename in filenames:
+                dependencies[filename] = os.path.getmtime(filename)
+        return dependencies
+
+    def not_found_dependencies(self):
+        dependencies = templates.find_dependencies(self.not_found_template, self.template_dirs)
+        dependencies.update(self.data_dependencies())
+        return dependencies
+
+    def postprocess(self, content):
+        """
+        Returns rendered page content after the optional post-render
+        stages. Pages are cached afterwards, so they run once per
+        version of a page.
+
+        Streamed pages skip them, they can't be applied to partial
+        output.
+
+        """
+        if self.minify:
+            content = minify.minify_html(content)
+        return content
+
+    def dependencies(self, path):
+        """
+        Returns a dict mapping the template and data files path is built
+        from to their modification times.
+
+        """
+        route = self.routes.get(path)
+        if route is None:
+            return {}
+        dependencies = templates.find_dependencies(route[0], self.template_dirs)
+        dependencies.update(self.data_dependencies(path))
+        return dependencies
+
+    def render_page(self, path, timings=NULL_TIMINGS, script_root=''):
+        """
+        Renders path into a Page that knows which template files it was
+        built from.
+
+        """
+        dependencies = self.dependencies(path)
+        route = self.routes.get(path)
+        if route is not None:
+            self.expire_templates(route[0], dependencies)
+        timings.mark('resolve')
+        content = self.postprocess(self.render(path, timings, script_root))
+        return Page(content.encode('utf-8'), dependencies)
@@ -0,0 +1,157 @@
+import math
+import re
+import threading
+from timeit import default_timer
+
+from werkzeug.test import Client, EnvironBuilder
+from werkzeug.wrappers import BaseResponse
+
+from fugleman import templates
+
+
+LINK_RE = re.compile(r"""href=["'](/[^"'#?]*)""")
+
+OUTCOMES = ('render', 'redirect', 'not_found', 'error')
+
+
+def outcome(status):
+    """
+    Returns the outcome a response status is counted under.
+
+    """
+    if status < 300 or status == 304:
+        return 'render'
+    if status < 400:
+        return 'redirect'
+    if status == 404:
+        return 'not_found'
+    return 'error'
+
+
+def percentile(latencies, p):
+    """
+    Returns the p-th percentile of a sorted list of latencies using the
+    nearest-rank method.
+
+    """
+    if not latencies:
+        return None
+    index = int(math.ceil(p / 100.0 * len(latencies))) - 1
+    return latencies[max(index, 0)]
+
+
+def crawl(application, start='/', limit=1000):
+    """
+    Returns the paths reachable from start by following the site's own
+    links, rendering each page through the application.
+
+    """
+    client = Client(application, BaseResponse)
+    paths = [start]
+    seen = set(paths)
+    for path in paths:
+        if len(seen) >= limit:
+            break
+        response = client.get(path)
+        if response.status_code != 200:
+            continue
+        for link in LINK_RE.findall(response.data.decode('utf-8', 'replace')):
+            if link not in seen and len(seen) < limit:
+                seen.add(link)
+                paths.append(link)
+    return paths
+
+
+def default_paths(application):
+    """
+    Returns every path the application's templates can serve.
+
+    """
+    return templates.find_paths(application.template_dirs)
+
+
+class BenchResult(object):
+
+    def __init__(self, duration, concurrency, latencies):
+        self.duration = duration
+        self.concurrency = concurrency
+        self.latencies = dict((name, sorted(values)) for name, values in latencies.items())
+
+    @property
+    def requests(self):
+        return sum(len(values) for values in self.latencies.values())
+
+    @property
+    def requests_per_second(self):
+        return self.requests / self.duration if self.duration else 0.0
+
+    def percentiles(self, name):
+        """
+        Returns the p50, p95 and p99 latencies in seconds for an outcome.
+
+        """
+        latencies = self.latencies.get(name, [])
+        return tuple(percentile(latencies, p) for p in (50, 95, 99))
+
+
+class Benchmark(object):
+    """
+    Drives a WSGI application in-process from concurrency threads for
+    duration seconds, cycling through paths and timing every request.
+
+    """
+
+    def __init__(self, application, paths, concurrency=1, duration=10.0):
+        self.application = application
+        self.paths = paths
+        self.concurrency = concurrency
+        self.duration = duration
+        self.environs = [EnvironBuilder(path=path).get_environ() for path in paths]
+
+    def run(self):
+        latencies = dict((name, []) for name in OUTCOMES)
+        lock = threading.Lock()
+        deadline = default_timer() + self.duration
+
+        def worker(offset):
+            local = dict((name, []) for name in OUTCOMES)
+            i = offset
+            while default_timer() < deadline:
+                latency, status = self.request(self.environs[i % len(self.environs)])
+                local[outcome(status)].append(latency)
+                i += 1
+            with lock:
+                for name, values in local.items():
+                    latencies[name].extend(values)
+
+        start = default_timer()
+        threads = [threading.Thread(target=worker, args=(i,)) for i in range(self.concurrency)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return BenchResult(default_timer() - start, self.concurrency, latencies)
+
+    def request(self, environ):
+        """
+        Makes a request and returns its latency and status code.
+
+        """
+        # The request object caches itself in the environ, start fresh.
+        environ = dict(environ)
+        environ['wsgi.input'].seek(0)
+        status = []
+
+        def start_response(status_line, headers, exc_info=None):
+            status.append(int(status_line.split(None, 1)[0]))
+            return lambda data: None
+
+        start = default_timer()
+        app_iter = self.application(environ, start_response)
+        try:
+            for data in app_iter:
+                pass
+        finally:
+            if hasattr(app_iter, 'close'):
+                app_iter.close()
+        return default_timer() - start, status[0]
@@ -0,0 +1,260 @@
+import json
+import multiprocessing
+import os
+import shutil
+import time
+
+from fugleman import compression, templates
+from fugleman.minify import minify_html
+
+
+# The application used by render_page, set in each worker process by
+# init_worker.
+_application = None
+
+
+def init_worker(module_name, var_name):
+    global _application
+    from fugleman.commands import load_application
+    _application = load_application(module_name, var_name)
+
+
+def write_file(filename, content):
+    with open(filename, 'wb') as f:
+        f.write(content)
+
+
+def copy_file(source, destination):
+    """
+    Copies source to destination unless it's already there with the
+    same size and modification time.
+
+    """
+    stat = os.stat(source)
+    try:
+        existing = os.stat(destination)
+    except OSError:
+        existing = None
+    if existing is not None and (existing.st_size, int(existing.st_mtime)) == \
+            (stat.st_size, int(stat.st_mtime)):
+        return
+    directory = os.path.dirname(destination)
+    if not os.path.isdir(directory):
+        os.makedirs(directory)
+    shutil.copy2(source, destination)
+
+
+def render_page(job):
+    """
+    Renders a request path to filename, returning the path and an error
+    message if it failed.
+
+    With precompress, a compressed copy is written next to the page for
+    every encoding, like `index.html.gz`, for servers that can send them
+    as they are.
+
+    """
+    path, filename, minify, precompress = job
+    try:
+        content = _application.render(path)
+    except Exception as e:
+        return path, '%s: %s' % (e.__class__.__name__, e)
+    if minify:
+        content = minify_html(content)
+    content = content.encode('utf-8')
+    dirname = os.path.dirname(filename)
+    if not os.path.isdir(dirname):
+        try:
+            os.makedirs(dirname)
+        except OSError:
+            pass  # Another worker created it
+    write_file(filename, content)
+    for encoding, extension in Builder.COMPRESSED_EXTENSIONS:
+        compressed_filename = '%s%s' % (filename, extension)
+        if precompress and encoding in compression.ENCODERS:
+            write_file(compressed_filename, compression.compress(content, encoding))
+        elif os.path.exists(compressed_filename):
+            os.remove(compressed_filename)
+    return path, None
+
+
+class BuildResult(object):
+
+    def __init__(self):
+        self.rendered = 0
+        self.skipped = 0
+        self.removed = 0
+        self.errors = {}
+        self.duration = 0.0
+
+
+class Builder(object):
+    """
+    Renders every page of an application to static files.
+
+    Pages are written to `<output_dir>/<path>/index.html` so the output
+    can be served by any web server. With more than one job the pages
+    are rendered in a pool of processes that each load the application
+    from the fugfile.
+
+    A manifest of the templates each page was built from and their
+    content hashes is kept in the output directory, so later builds
+    only render pages whose templates changed. Changing the minify or
+    precompress options, or the fingerprint of any static file, renders
+    everything again.
+
+    The application's static files are copied to the output directory,
+    along with a fingerprinted copy of each and an `assets.json`
+    manifest mapping their names to the fingerprinted names.
+
+    """
+    MANIFEST_NAME = '.fugleman-manifest.json'
+    MANIFEST_VERSION = 2
+
+    COMPRESSED_EXTENSIONS = (('gzip', '.gz'), ('br', '.br'))
+
+    def __init__(self, application, output_dir, jobs=None, fugfile='fugfile', var_name='app',
+                 minify=False, precompress=False):
+        self.application = application
+        self.output_dir = output_dir
+        self.jobs = jobs or multiprocessing.cpu_count()
+        self.fugfile = fugfile
+        self.var_name = var_name
+        self.minify = minify
+        self.precompress = precompress
+
+    @property
+    def options(self):
+        options = {'minify': self.minify, 'precompress': self.precompress}
+        manifest = self.asset_manifest
+        if manifest is not None:
+            # Pages link to the fingerprinted names.
+            options['assets'] = manifest.names
+        return options
+
+    @property
+    def asset_manifest(self):
+        static = getattr(self.application, 'static', None)
+        if static is None:
+            return None
+        return static.manifest
+
+    @property
+    def manifest_filename(self):
+        return os.path.join(self.output_dir, self.MANIFEST_NAME)
+
+    def output_filename(self, path):
+        return os.path.join(self.output_dir, path.strip('/'), 'index.html')
+
+    def build(self, force=False):
+        """
+        Renders the pages whose templates changed since the last build,
+        or all of them when force is True, and returns a BuildResult.
+
+        """
+        start = time.time()
+        result = BuildResult()
+        previous = {} if force else self.load_manifest()
+        manifest = {}
+        hashes = {}
+        jobs = []
+
+        for path in templates.find_paths(self.application.template_dirs):
+            dependencies = {}
+            for filename in self.application.dependencies(path):
+                if filename not in hashes:
+                    hashes[filename] = templates.hash_template(filename)
+                dependencies[filename] = hashes[filename]
+            manifest[path] = dependencies
+
+            output = self.output_filename(path)
+            if previous.get(path) == dependencies and os.path.exists(output):
+                result.skipped += 1
+            else:
+                jobs.append((path, output, self.minify, self.precompress))
+
+        for path, error in self.render(jobs):
+            if error is None:
+                result.rendered += 1
+            else:
+                result.errors[path] = error
+                # Leave failed pages out so they are retried next time.
+                del manifest[path]
+
+        for path in set(previous) - set(manifest):
+            filename = self.output_filename(path)
+            try:
+                os.remove(filename)
+                result.removed += 1
+            except OSError:
+                pass
+            for encoding, extension in self.COMPRESSED_EXTENSIONS:
+                try:
+                    os.remove('%s%s' % (filename, extension))
+                except OSError:
+                    pass
+
+        self.save_manifest(manifest)
+        self.copy_static()
+        result.duration = time.time() - start
+        return result
+
+    def load_manifest(self):
+        """
+        Returns the page dependencies recorded by the last build.
+
+        """
+        try:
+            with open(self.manifest_filename) as f:
+                manifest = json.load(f)
+        except (IOError, ValueError):
+            return {}
+        if manifest.get('version') != self.MANIFEST_VERSION:
+            return {}
+        if manifest.get('options') != self.options:
+            return {}
+        return manifest.get('pages', {})
+
+    def save_manifest(self, pages):
+        if not os.path.isdir(self.output_dir):
+            os.makedirs(self.output_dir)
+        tmp_filename = '%s.tmp' % self.manifest_filename
+        with open(tmp_filename, 'w') as f:
+            json.dump({'version': self.MANIFEST_VERSION, 'options': self.options, 'pages': pages},
+                      f, indent=2, sort_keys=True)
+        os.rename(tmp_filename, self.manifest_filename)
+
+    def copy_static(self):
+        """
+        Copies the application's static files, and their fingerprinted
+        copies, to the output directory.
+
+        """
+        static = getattr(self.application, 'static', None)
+        if static is None:
+            return
+        static_dir = os.path.join(self.output_dir, *static.url.strip('/').split('/'))
+        names = static.manifest.names if static.manifest is not None else {}
+        for root, dirnames, filenames in os.walk(static.root):
+            for name in filenames:
+                filename = os.path.join(root, name)
+                name = os.path.relpath(filename, static.root).replace(os.sep, '/')
+                for copy in (name, names.get(name)):
+                    if copy is not None:
+                        copy_file(filename, os.path.join(static_dir, *copy.split('/')))
+        if static.manifest is not None:
+            static.manifest.save(os.path.join(static_dir, 'assets.json'))
+
+    def render(self, jobs):
+        global _application
+        if self.jobs == 1 or len(jobs) <= 1:
+            _application = self.application
+            return [render_page(job) for job in jobs]
+
+        pool = multiprocessing.Pool(self.jobs, init_worker, (self.fugfile, self.var_name))
+        try:
+            chunksize = max(1, len(jobs) // (self.jobs * 4))
+            return list(pool.imap_unordered(render_page, jobs, chunksize))
+        finally:
+            pool.close()
+            pool.join()
@@ -0,0 +1,570 @@
+import hashlib
+import json
+import mmap
+import os
+import struct
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from datetime import datetime
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+from fugleman import compression
+
+
+def last_modified(dependencies):
+    """
+    Returns the modification time of the newest file in dependencies as
+    a datetime, or None if there are none.
+
+    """
+    if not dependencies:
+        return None
+    return datetime.utcfromtimestamp(int(max(dependencies.values())))
+
+
+class Page(object):
+    """
+    A rendered page along with the modification times of the template
+    files used to build it.
+
+    """
+
+    def __init__(self, content, dependencies, etag=None):
+        self.content = content
+        self.dependencies = dependencies
+        self.etag = etag or hashlib.sha1(content).hexdigest()
+        self.last_modified = last_modified(dependencies)
+        self.encoded = {}
+
+    def encode(self, encoding):
+        """
+        Returns the content compressed with encoding, compressing it the
+        first time it's asked for.
+
+        """
+        try:
+            return self.encoded[encoding]
+        except KeyError:
+            content = self.encoded[encoding] = compression.compress(self.content, encoding)
+            return content
+
+    def is_stale(self):
+        """
+        Returns True if any of the templates used to build the page have
+        changed or been removed since it was rendered.
+
+        """
+        for filename, mtime in self.dependencies.items():
+            try:
+                if os.path.getmtime(filename) != mtime:
+                    return True
+            except OSError:
+                return True
+        return False
+
+
+class PageCache(object):
+    """
+    A bounded LRU cache of rendered pages keyed by request path.
+
+    Unless check_stale is False, pages are checked against their
+    templates on every hit so an edited template is picked up on the
+    next request. Applications that watch their templates turn it off
+    and invalidate pages as they change instead.
+
+    """
+
+    def __init__(self, max_size=128, check_stale=True):
+        self.max_size = max_size
+        self.check_stale = check_stale
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self._pages = OrderedDict()
+        # Counts the invalidations, so a page checked outside the lock
+        # isn't put back after it was invalidated.
+        self._generation = 0
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._pages)
+
+    def get(self, key):
+        """
+        Returns the cached page for key or None if it's missing or stale.
+
+        """
+        with self._lock:
+            page = self._pages.pop(key, None)
+            if page is None:
+                self.misses += 1
+                return None
+            if not self.check_stale:
+                self.hits += 1
+                self._pages[key] = page
+                return page
+            generation = self._generation
+
+        # The entry is out of the cache while its templates are checked
+        # so other threads aren't held up by the filesystem.
+        if page.is_stale():
+            with self._lock:
+                self.invalidations += 1
+                self.misses += 1
+            return None
+
+        with self._lock:
+            self.hits += 1
+            # Pages invalidated while this one was out of the cache may
+            # have included it, so it isn't put back.
+            if key not in self._pages and self._generation == generation:
+                self._pages[key] = page
+                self._trim()
+        return page
+
+    def set(self, key, page):
+        """
+        Stores page under key, evicting the least recently used pages
+        when the cache is full.
+
+        """
+        if self.max_size <= 0:
+            return
+        with self._lock:
+            self._pages.pop(key, None)
+            self._pages[key] = page
+            self._trim()
+
+    def invalidate(self, func):
+        """
+        Removes the pages for which func(key, page) returns True and
+        returns them.
+
+        """
+        with self._lock:
+            removed = [(key, page) for key, page in self._pages.items() if func(key, page)]
+            for key, page in removed:
+                del self._pages[key]
+            self.invalidations += len(removed)
+            self._generation += 1
+        return [page for key, page in removed]
+
+    def clear(self):
+        with self._lock:
+            self._pages.clear()
+            self._generation += 1
+
+    def stats(self):
+        """
+        Returns a dict of the cache counters.
+
+        """
+        return {
+            'size': len(self._pages),
+            'max_size': self.max_size,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'invalidations': self.invalidations,
+        }
+
+    def _trim(self):
+        while len(self._pages) > self.max_size:
+            self._pages.popitem(last=False)
+            self.evictions += 1
+
+
+class FragmentCache(object):
+    """
+    A bounded LRU cache of rendered template fragments, used by the
+    `{% fugcache %}` tag.
+
+    """
+
+    def __init__(self, max_size=1024):
+        self.max_size = max_size
+        self._fragments = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._fragments)
+
+    def get(self, key):
+        """
+        Returns the fragment stored under key or None if it's missing or
+        expired.
+
+        """
+        with self._lock:
+            entry = self._fragments.pop(key, None)
+            if entry is None:
+                return None
+            content, expires = entry
+            if expires is not None and expires <= time.time():
+                return None
+            self._fragments[key] = entry
+            return content
+
+    def set(self, key, content, timeout=None):
+        """
+        Stores content under key for timeout seconds, or until it's
+        evicted when timeout is 0 or None.
+
+        """
+        if self.max_size <= 0:
+            return
+        expires = time.time() + timeout if timeout else None
+        with self._lock:
+            self._fragments.pop(key, None)
+            self._fragments[key] = (content, expires)
+            while len(self._fragments) > self.max_size:
+                self._fragments.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._fragments.clear()
+
+
+class SharedPageCache(object):
+    """
+    A cache of rendered pages in a memory mapped file, shared by every
+    process that opens the same filename, so a page rendered by one
+    worker is a hit in all the others.
+
+    The file starts with a header, then an index of max_size slots and
+    a ring of data_size bytes that pages are appended to, overwriting
+    the oldest ones. A key can be stored in any of the PROBE slots after
+    its hash, when they're all taken the oldest page is evicted.
+
+    Readers take no locks. Each slot has a sequence number that's odd
+    while it's written, and the ring's head is moved before a page is
+    written over old ones, so a reader that sees either change retries
+    or misses. Writers hold an fcntl lock on `<filename>.lock`.
+
+    A file whose header doesn't match the version, max_size and
+    data_size of this cache is replaced rather than reused, so workers
+    restarted with new settings start a new file while old workers keep
+    the one they have.
+
+    Pages are decoded again on every hit, except for the last memo_size
+    pages used in this process, which are kept along with their
+    compressed copies until they change.
+
+    """
+    MAGIC = b'FUGCACHE'
+    VERSION = 1
+    PROBE = 8
+
+    # Magic, version, slot count, data size and the ring's head, which
+    # only ever grows; a page's position in the ring is head % data size.
+    HEADER = struct.Struct('<8sIIQQ')
+    HEAD_OFFSET = 24
+
+    # Sequence number, page length, key hash and position of the page.
+    SLOT = struct.Struct('<IIQQ')
+
+    # Key length, etag length and dependencies length of a page record.
+    RECORD = struct.Struct('<HHI')
+
+    def __init__(self, filename, max_size=128, data_size=64 * 1024 * 1024, check_stale=True,
+                 memo_size=64):
+        if fcntl is None:
+            raise ValueError("A shared page cache needs the fcntl module.")
+        self.filename = filename
+        self.max_size = max_size
+        self.data_size = data_size
+        self.check_stale = check_stale
+        self.memo_size = memo_size
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self.data_offset = self.HEADER.size + self.SLOT.size * max_size
+        self._memo = OrderedDict()
+        self._lock = threading.Lock()
+        self._lock_fd = os.open('%s.lock' % filename, os.O_RDWR | os.O_CREAT, 0o644)
+        with self.locked():
+            self._map = self.open()
+
+    def open(self):
+        """
+        Maps the cache file, creating it unless there is one with a
+        matching header.
+
+        """
+        size = self.data_offset + self.data_size
+        try:
+            fd = os.open(self.filename, os.O_RDWR)
+        except OSError:
+            fd = None
+        if fd is not None:
+            if os.fstat(fd).st_size == size:
+                header = os.read(fd, self.HEADER.size)
+                if header[:self.HEAD_OFFSET] == self.header()[:self.HEAD_OFFSET]:
+                    try:
+                        return mmap.mmap(fd, size)
+                    finally:
+                        os.close(fd)
+            os.close(fd)
+
+        tmp_filename = '%s.%d.tmp' % (self.filename, os.getpid())
+        fd = os.open(tmp_filename, os.O_RDWR | os.O_CREAT | os.O_TRUNC, 0o644)
+        try:
+            os.write(fd, self.header())
+            # The rest of the file is sparse, an index of zeros is empty.
+            os.ftruncate(fd, size)
+            os.rename(tmp_filename, self.filename)
+            return mmap.mmap(fd, size)
+        finally:
+            os.close(fd)
+
+    def header(self):
+        return self.HEADER.pack(self.MAGIC, self.VERSION, self.max_size, self.data_size, 0)
+
+    @contextmanager
+    def locked(self):
+        # fcntl locks belong to the process, the thread lock keeps this
+        # process's threads out of each other's way.
+        with self._lock:
+            fcntl.lockf(self._lock_fd, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.lockf(self._lock_fd, fcntl.LOCK_UN)
+
+    def __len__(self):
+        head = self.head()
+        return sum(1 for index in range(self.max_size)
+                   if self.is_live(self.read_slot(index), head))
+
+    def key_hash(self, key):
+        if not isinstance(key, bytes):
+            key = key.encode('utf-8')
+        return struct.unpack('<Q', hashlib.sha1(key).digest()[:8])[0]
+
+    def slots(self, key_hash):
+        return [(key_hash + i) % self.max_size for i in range(min(self.PROBE, self.max_size))]
+
+    def head(self):
+        return struct.unpack_from('<Q', self._map, self.HEAD_OFFSET)[0]
+
+    def read_slot(self, index):
+        """
+        Returns the (length, key hash, position) in slot index, or None
+        if it's empty.
+
+        """
+        offset = self.HEADER.size + self.SLOT.size * index
+        for attempt in range(100):
+            seq, length, key_hash, position = self.SLOT.unpack_from(self._map, offset)
+            if seq % 2 == 0 and struct.unpack_from('<I', self._map, offset)[0] == seq:
+                break
+            # A writer is halfway through the slot.
+            time.sleep(0)
+        else:
+            # Left half written by a writer that died.
+            return None
+        if not length:
+            return None
+        return length, key_hash, position
+
+    def write_slot(self, index, length=0, key_hash=0, position=0):
+        offset = self.HEADER.size + self.SLOT.size * index
+        seq = struct.unpack_from('<I', self._map, offset)[0]
+        # Odd while the slot is written, which it already is if a writer
+        # died halfway through.
+        seq = (seq | 1) % 2 ** 32
+        struct.pack_into('<I', self._map, offset, seq)
+        self.SLOT.pack_into(self._map, offset, seq, length, key_hash, position)
+        struct.pack_into('<I', self._map, offset, (seq + 1) % 2 ** 32)
+
+    def is_live(self, slot, head):
+        # Pages the ring has moved past have been overwritten.
+        return slot is not None and slot[2] >= head - self.data_size
+
+    def find(self, key):
+        """
+        Returns the slot index and contents for key, or None.
+
+        """
+        key_hash = self.key_hash(key)
+        head = self.head()
+        for index in self.slots(key_hash):
+            slot = self.read_slot(index)
+            if self.is_live(slot, head) and slot[1] == key_hash:
+                return index, slot
+        return None
+
+    def load(self, key, slot):
+        """
+        Returns the page stored at slot, or None if it was overwritten
+        or belongs to another key.
+
+        """
+        length, key_hash, position = slot
+        offset = self.data_offset + position % self.data_size
+        record = self._map[offset:offset + length]
+        if not self.is_live(slot, self.head()):
+            return None
+        key_length, etag_length, dependencies_length = self.RECORD.unpack_from(record)
+        start = self.RECORD.size
+        stored_key = record[start:start + key_length].decode('utf-8')
+        if stored_key != key:
+            return None
+        start += key_length
+        etag = record[start:start + etag_length].decode('ascii')
+        start += etag_length
+        dependencies = json.loads(record[start:start + dependencies_length].decode('utf-8'))
+        content = record[start + dependencies_length:]
+        return Page(content, dependencies, etag)
+
+    def get(self, key):
+        """
+        Returns the cached page for key or None if it's missing or stale.
+
+        """
+        found = self.find(key)
+        page = None
+        if found is not None:
+            index, slot = found
+            memo = self._memo.get(key)
+            if memo is not None and memo[0] == slot:
+                page = memo[1]
+            else:
+                page = self.load(key, slot)
+                if page is not None:
+                    self.remember(key, slot, page)
+
+        if page is None:
+            self.misses += 1
+            return None
+        if self.check_stale and page.is_stale():
+            self.invalidations += 1
+            self.misses += 1
+            self.remove(key)
+            return None
+        self.hits += 1
+        return page
+
+    def remember(self, key, slot, page):
+        if self.memo_size <= 0:
+            return
+        with self._lock:
+            self._memo.pop(key, None)
+            self._memo[key] = (slot, page)
+            while len(self._memo) > self.memo_size:
+                self._memo.popitem(last=False)
+
+    def set(self, key, page):
+        """
+        Stores page under key, evicting the oldest pages when there's no
+        room for it.
+
+        """
+        if self.max_size <= 0:
+            return
+        key_bytes = key.encode('utf-8')
+        etag = page.etag.encode('ascii')
+        dependencies = json.dumps(page.dependencies).encode('utf-8')
+        record = b''.join([self.RECORD.pack(len(key_bytes), len(etag), len(dependencies)),
+                           key_bytes, etag, dependencies, page.content])
+        length = len(record)
+        if length > self.data_size:
+            return
+        key_hash = self.key_hash(key)
+
+        with self.locked():
+            position = self.head()
+            if position % self.data_size + length > self.data_size:
+                # Pages don't wrap around the end of the ring.
+                position += self.data_size - position % self.data_size
+            # Move the head first, readers of the pages about to be
+            # overwritten see they're gone.
+            struct.pack_into('<Q', self._map, self.HEAD_OFFSET, position + length)
+            offset = self.data_offset + position % self.data_size
+            self._map[offset:offset + length] = record
+
+            head = position + length
+            slots = [(index, self.read_slot(index)) for index in self.slots(key_hash)]
+            live = [(index, slot) for index, slot in slots if self.is_live(slot, head)]
+            replaced = [index for index, slot in live if slot[1] == key_hash]
+            free = [index for index, slot in slots if not self.is_live(slot, head)]
+            if replaced:
+                index = replaced[0]
+            elif free:
+                index = free[0]
+            else:
+                index = min(live, key=lambda item: item[1][2])[0]
+                self.evictions += 1
+            slot = (length, key_hash, position)
+            self.write_slot(index, *slot)
+        self.remember(key, slot, page)
+
+    def remove(self, key):
+        with self.locked():
+            found = self.find(key)
+            if found is not None:
+                self.write_slot(found[0])
+
+    def keys(self):
+        """
+        Returns the (key, slot index, slot) of every page in the cache.
+
+        """
+        head = self.head()
+        result = []
+        for index in range(self.max_size):
+            slot = self.read_slot(index)
+            if self.is_live(slot, head):
+                offset = self.data_offset + slot[2] % self.data_size
+                header = self._map[offset:offset + self.RECORD.size]
+                key_length = self.RECORD.unpack(header)[0]
+                start = offset + self.RECORD.size
+                key = self._map[start:start + key_length].decode('utf-8')
+                result.append((key, index, slot))
+        return result
+
+    def invalidate(self, func):
+        """
+        Removes the pages for which func(key, page) returns True and
+        returns them.
+
+        """
+        removed = []
+        with self.locked():
+            for key, index, slot in self.keys():
+                page = self.load(key, slot)
+                if page is not None and func(key, page):
+                    self.write_slot(index)
+                    removed.append(page)
+        self.invalidations += len(removed)
+        return removed
+
+    def clear(self):
+        with self.locked():
+            for index in range(self.max_size):
+                self.write_slot(index)
+        with self._lock:
+            self._memo.clear()
+
+    def stats(self):
+        """
+        Returns a dict of the cache counters, the size is of the shared
+        file and the others are of this process.
+
+        """
+        return {
+            'size': len(self),
+            'max_size': self.max_size,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'invalidations': self.invalidations,
+        }
@@ -1,11 +1,14 @@
+import multiprocessing
 import os
 import sys
+import time
 from importlib import import_module
 from optparse import OptionParser, make_option
 
-from werkzeug.serving import run_simple
+from fugleman import __version__, reloader
 
-from fugleman import __version__
+# Commands import what they run with in handle, so `fug help` and `fug
+# version` start without loading Django or Werkzeug.
 
 
 class CommandError(Exception):
@@ -19,6 +22,31 @@ class CommandError(Exception):
     pass
 
 
+def load_application(module_name, var_name):
+    """
+    Imports the fugfile module_name and returns its var_name attribute.
+
+    """
+    if os.getcwd() not in sys.path:
+        sys.path.insert(0, os.getcwd())
+        inserted = True
+    else:
+        inserted = False
+
+    try:
+        module = import_module(module_name)
+    except ImportError:
+        raise CommandError("Could not load the fugfile named '%s'" % module_name)
+    finally:
+        if inserted:
+            del sys.path[0]
+
+    try:
+        return getattr(module, var_name)
+    except AttributeError:
+        raise CommandError("Cound not find the application named '%s'" % var_name)
+
+
 class BaseCommand(object):
     help = ''
     args = ''
@@ -70,7 +98,11 @@ class BaseCommand(object):
         raise NotImplementedError
 
 
-class ServeCommand(BaseCommand):
+class ApplicationCommand(BaseCommand):
+    """
+    Base class for commands that load the application from a fugfile.
+
+    """
     option_list = (
         make_option('-f', '--fugfile',
             dest='fugfile',
@@ -88,12 +120,73 @@ class ServeCommand(BaseCommand):
                  'fugfile. Defaults to app.',
         ),
     )
+
+    def load_application(self, module_name, var_name):
+        return load_application(module_name, var_name)
+
+    def load_single_application(self, module_name, var_name):
+        """
+        Loads the application like load_application, for commands that
+        work with the routes of one application rather than a Sites.
+
+        """
+        application = self.load_application(module_name, var_name)
+        if not hasattr(application, 'routes'):
+            raise CommandError("The %s command works with one application but '%s' serves "
+                               "several, point --app at one of them." % (self.name, var_name))
+        return application
+
+
+class ServeCommand(ApplicationCommand):
+    option_list = ApplicationCommand.option_list + (
+        make_option('--production',
+            dest='production',
+            action='store_true',
+            default=False,
+            help='Serve with forked worker processes and without the '
+                 'reloader or debugger.',
+        ),
+        make_option('-w', '--workers',
+            dest='workers',
+            action='store',
+            type='int',
+            metavar='N',
+            default=None,
+            help='The number of worker processes to fork. Implies '
+                 '--production. Defaults to the number of CPUs.',
+        ),
+        make_option('-t', '--threads',
+            dest='threads',
+            action='store',
+            type='int',
+            metavar='N',
+            default=None,
+            help='The number of threads handling connections in each '
+                 'worker. Implies --production. Defaults to 8.',
+        ),
+        make_option('--warmup',
+            dest='warmup',
+            action='store_true',
+            default=False,
+            help='Compile every template before accepting connections.',
+        ),
+    )
     help = "Starts a development server for serving your Fugleman project."
     args = '[optional port number, or ipaddr:port]'
 
     DEFAULT_ADDR = '127.0.0.1'
     DEFAULT_PORT = '8989'
 
+    # Idle keep-alive connections hold on to a thread, so one per worker
+    # isn't enough.
+    DEFAULT_THREADS = 8
+
+    production = False
+    workers = 1
+    threads = 1
+    fugfile = 'fugfile'
+    warmup = False
+
     def handle(self, addrport=None, *args, **options):
         if addrport is None:
             addr = self.DEFAULT_ADDR
@@ -110,9 +203,27 @@ class ServeCommand(BaseCommand):
         except ValueError:
             raise CommandError("%r is not a valid port number." % port)
 
-        module_name = options.get('fugfile')
+        workers = options.get('workers')
+        threads = options.get('threads')
+        if options.get('production') or workers or threads:
+            if workers is None:
+                workers = multiprocessing.cpu_count()
+            if threads is None:
+                threads = self.DEFAULT_THREADS
+            if workers < 1 or threads < 1:
+                raise CommandError("There must be at least one worker and thread.")
+            if workers > 1 and not hasattr(os, 'fork'):
+                raise CommandError("Multiple workers are not supported on this platform.")
+            self.production = True
+            self.workers = workers
+            self.threads = threads
+
+        self.warmup = options.get('warmup', False)
+
+        module_name = options.get('fugfile') or self.fugfile
         var_name = options.get('application')
         application = self.load_application(module_name, var_name)
+        self.fugfile = module_name
 
         try:
             self.run(application, addr, port)
@@ -120,6 +231,60 @@ class ServeCommand(BaseCommand):
             sys.exit(0)
 
     def run(self, application, addr, port):
+        if self.production:
+            self.run_production(application, addr, port)
+        else:
+            self.run_development(application, addr, port)
+
+    def warm_up(self, application):
+        count, duration = application.warmup()
+        self.stdout.write("Compiled %d templates in %.2fs.\n" % (count, duration))
+
+    def run_production(self, application, addr, port):
+        self.stdout.write((
+            "Fugleman version %(version)s\n"
+            "Production server is running at http://%(addr)s:%(port)s/ "
+            "with %(workers)d workers of %(threads)d threads.\n"
+        ) % {
+            'version': __version__,
+            'addr': addr,
+            'port': port,
+            'workers': self.workers,
+            'threads': self.threads,
+        })
+        if self.warmup:
+            # Before forking, so the workers share the compiled templates.
+            self.warm_up(application)
+        from fugleman.accesslog import has_access_log
+        from fugleman.server import KeepAliveRequestHandler, QuietKeepAliveRequestHandler, serve
+        if has_access_log(application):
+            handler = QuietKeepAliveRequestHandler
+        else:
+            handler = KeepAliveRequestHandler
+        serve(application, addr, port, self.workers, self.threads, handler)
+
+    def run_development(self, application, addr, port):
+        """
+        Serves application with the debugger in a child process that's
+        restarted when the fugfile changes.
+
+        Templates are watched by the application itself, so editing them
+        doesn't restart anything.
+
+        """
+        if reloader.is_reloader_child():
+            from werkzeug.serving import run_simple
+
+            from fugleman.accesslog import has_access_log
+            from fugleman.server import QuietRequestHandler
+            fugfile = reloader.source_filename(sys.modules[self.fugfile])
+            reloader.watch_files([fugfile])
+            if self.warmup:
+                self.warm_up(application)
+            handler = QuietRequestHandler if has_access_log(application) else None
+            run_simple(addr, port, application, use_debugger=True, request_handler=handler)
+            return
+
         self.stdout.write((
             "Fugleman version %(version)s\n"
             "Development server is running at http://%(addr)s:%(port)s/\n"
@@ -130,24 +295,200 @@ class ServeCommand(BaseCommand):
             'port': port,
             'quit_command': (sys.platform == 'win32') and 'CTRL-BREAK' or 'CONTROL-C',
         })
-        run_simple(addr, port, application, use_reloader=True, use_debugger=True)
+        sys.exit(reloader.restart_with_reloader())
 
-    def load_application(self, module_name, var_name):
-        if os.getcwd() not in sys.path:
-            sys.path.insert(0, os.getcwd())
-            inserted = True
-        else:
-            inserted = False
 
-        try:
-            module = import_module(module_name)
-        except ImportError:
-            raise CommandError("Could not load the fugfile named '%s'" % module_name)
-        finally:
-            if inserted:
-                del sys.path[0]
+class BuildCommand(ApplicationCommand):
+    option_list = ApplicationCommand.option_list + (
+        make_option('-o', '--output',
+            dest='output',
+            action='store',
+            metavar='DIR',
+            default='build',
+            help='The directory to write the rendered pages to. Defaults '
+                 'to build.',
+        ),
+        make_option('-j', '--jobs',
+            dest='jobs',
+            action='store',
+            type='int',
+            metavar='N',
+            default=None,
+            help='The number of processes to render with. Defaults to the '
+                 'number of CPUs.',
+        ),
+        make_option('--force',
+            dest='force',
+            action='store_true',
+            default=False,
+            help='Render every page, even those whose templates have not '
+                 'changed since the last build.',
+        ),
+        make_option('--minify',
+            dest='minify',
+            action='store_true',
+            default=False,
+            help='Remove comments and extra whitespace from the pages.',
+        ),
+        make_option('--precompress',
+            dest='precompress',
+            action='store_true',
+            default=False,
+            help='Write compressed copies of every page next to it, for '
+                 'servers like nginx with gzip_static.',
+        ),
+    )
+    help = "Renders every page of your Fugleman project to static files."
 
-        try:
-            return getattr(module, var_name)
-        except AttributeError:
-            raise CommandError("Cound not find the application named '%s'" % var_name)
+    def handle(self, *args, **options):
+        module_name = options.get('fugfile')
+        var_name = options.get('application')
+        application = self.load_single_application(module_name, var_name)
+
+        from fugleman.build import Builder
+        builder = Builder(application, options.get('output'), options.get('jobs'),
+                          module_name, var_name, options.get('minify', False),
+                          options.get('precompress', False))
+        result = builder.build(force=options.get('force'))
+
+        for path, error in sorted(result.errors.items()):
+            self.stdout.write("Could not render %s: %s\n" % (path, error))
+        self.stdout.write("Rendered %d pages to %s in %.2fs (%d unchanged, %d removed).\n" % (
+            result.rendered, builder.output_dir, result.duration, result.skipped, result.removed))
+
+        if result.errors:
+            raise CommandError("%d pages could not be rendered." % len(result.errors))
+
+
+class BenchCommand(ApplicationCommand):
+    option_list = ApplicationCommand.option_list + (
+        make_option('-c', '--concurrency',
+            dest='concurrency',
+            action='store',
+            type='int',
+            metavar='N',
+            default=1,
+            help='The number of threads making requests. Defaults to 1.',
+        ),
+        make_option('-d', '--duration',
+            dest='duration',
+            action='store',
+            type='float',
+            metavar='SECONDS',
+            default=10.0,
+            help='How long to run for. Defaults to 10 seconds.',
+        ),
+        make_option('--crawl',
+            dest='crawl',
+            action='store_true',
+            default=False,
+            help='Request the pages reachable by following links from the '
+                 'given paths, or from / when none are given.',
+        ),
+    )
+    help = ("Benchmarks your Fugleman project in-process. Requests every "
+            "page unless paths are given.")
+    args = '[path ...]'
+
+    def handle(self, *paths, **options):
+        module_name = options.get('fugfile')
+        var_name = options.get('application')
+        application = self.load_application(module_name, var_name)
+
+        from fugleman.bench import Benchmark, crawl, default_paths
+        concurrency = options.get('concurrency') or 1
+        duration = options.get('duration') or 10.0
+        if concurrency < 1:
+            raise CommandError("The concurrency must be at least 1.")
+
+        paths = list(paths)
+        if options.get('crawl'):
+            crawled = []
+            for start in paths or ['/']:
+                crawled.extend(path for path in crawl(application, start) if path not in crawled)
+            paths = crawled
+        elif not paths:
+            if not hasattr(application, 'template_dirs'):
+                raise CommandError("'%s' serves several applications, give the paths to "
+                                   "benchmark or --crawl." % var_name)
+            paths = default_paths(application)
+        if not paths:
+            raise CommandError("There are no paths to benchmark.")
+
+        self.stdout.write("Benchmarking %d paths with %d threads for %.1fs...\n" % (
+            len(paths), concurrency, duration))
+        result = Benchmark(application, paths, concurrency, duration).run()
+        self.print_result(result)
+
+    def print_result(self, result):
+        from fugleman.bench import OUTCOMES
+        self.stdout.write("%d requests in %.2fs, %.1f requests/sec\n\n" % (
+            result.requests, result.duration, result.requests_per_second))
+        self.stdout.write("%-10s %10s %10s %10s %10s\n" % ('outcome', 'requests', 'p50', 'p95', 'p99'))
+        for name in OUTCOMES:
+            count = len(result.latencies[name])
+            if not count:
+                continue
+            self.stdout.write("%-10s %10d %8.2fms %8.2fms %8.2fms\n" % (
+                (name, count) + tuple(latency * 1000 for latency in result.percentiles(name))))
+
+
+class ProfileCommand(ApplicationCommand):
+    option_list = ApplicationCommand.option_list + (
+        make_option('-n', '--iterations',
+            dest='iterations',
+            action='store',
+            type='int',
+            metavar='N',
+            default=50,
+            help='How many times to render the page. Defaults to 50.',
+        ),
+        make_option('-o', '--output',
+            dest='output',
+            action='store',
+            metavar='PREFIX',
+            default='fugleman-profile',
+            help='The prefix of the .pstats and .collapsed files to write. '
+                 'Defaults to fugleman-profile.',
+        ),
+    )
+    help = ("Profiles rendering a page, writing a pstats file and a "
+            "collapsed stack file for flamegraph tools.")
+    args = '<path>'
+
+    def handle(self, path=None, *args, **options):
+        if path is None:
+            raise CommandError("A path to profile is required.")
+        if not path.endswith('/'):
+            path = '%s/' % path
+
+        module_name = options.get('fugfile')
+        var_name = options.get('application')
+        application = self.load_single_application(module_name, var_name)
+        if path not in application.routes:
+            raise CommandError("There is no template for %s." % path)
+
+        # Import lazily, the profiler needs Django's template machinery.
+        from fugleman.profiler import profile
+
+        iterations = options.get('iterations') or 1
+        prefix = options.get('output')
+        pstats_filename = '%s.pstats' % prefix
+        collapsed_filename = '%s.collapsed' % prefix
+
+        # Render once first so one-off imports don't skew the profile.
+        application.render(path)
+        # Timed on its own, the profilers slow rendering down.
+        start = time.time()
+        for i in range(iterations):
+            application.render(path)
+        duration = time.time() - start
+        profiler = profile(lambda: application.render(path), iterations,
+                           pstats_filename, collapsed_filename)
+
+        self.stdout.write("Rendered %s %d times in %.2fs without profiling (%.2fms each).\n" % (
+            path, iterations, duration, duration * 1000 / iterations))
+        self.stdout.write("Wrote %s and %s.\n\n" % (pstats_filename, collapsed_filename))
+        self.stdout.write("%12s  %s\n" % ('cumulative', 'template node'))
+        for label, seconds in profiler.top_nodes():
+            self.stdout.write("%10.2fms  %s\n" % (seconds * 1000 / iterations, label))
@@ -0,0 +1,94 @@
+import gzip
+import zlib
+from io import BytesIO
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+def gzip_compress(data):
+    buf = BytesIO()
+    # A fixed mtime keeps the output, and so its ETag, stable.
+    f = gzip.GzipFile(fileobj=buf, mode='wb', compresslevel=6, mtime=0)
+    try:
+        f.write(data)
+    finally:
+        f.close()
+    return buf.getvalue()
+
+
+class GzipCompressor(object):
+    """
+    Compresses a stream of chunks, flushing after each one so the client
+    can start decoding before the stream ends.
+
+    """
+
+    def __init__(self):
+        self.compressor = zlib.compressobj(6, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+
+    def compress(self, data):
+        return self.compressor.compress(data) + self.compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self):
+        return self.compressor.flush()
+
+
+class BrotliCompressor(object):
+
+    def __init__(self):
+        self.compressor = brotli.Compressor()
+
+    def compress(self, data):
+        return self.compressor.process(data) + self.compressor.flush()
+
+    def finish(self):
+        return self.compressor.finish()
+
+
+ENCODERS = {
+    'gzip': gzip_compress,
+}
+
+COMPRESSORS = {
+    'gzip': GzipCompressor,
+}
+
+if brotli is not None:
+    ENCODERS['br'] = brotli.compress
+    COMPRESSORS['br'] = BrotliCompressor
+
+# The encodings in order of preference, brotli compresses HTML better.
+ENCODINGS = [encoding for encoding in ('br', 'gzip') if encoding in ENCODERS]
+
+
+def negotiate(request):
+    """
+    Returns the preferred encoding the client accepts, or None if it
+    doesn't accept any of them.
+
+    """
+    for encoding in ENCODINGS:
+        if request.accept_encodings[encoding]:
+            return encoding
+    return None
+
+
+def compress(data, encoding):
+    return ENCODERS[encoding](data)
+
+
+def compress_stream(chunks, encoding):
+    """
+    Compresses an iterable of chunks with encoding, yielding compressed
+    data as it becomes available.
+
+    """
+    compressor = COMPRESSORS[encoding]()
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.finish()
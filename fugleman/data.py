@@ -0,0 +1,153 @@
+import json
+import os
+import threading
+
+try:
+    import yaml
+except ImportError:
+    yaml = None
+
+from fugleman import templates
+
+
+EXTENSIONS = ('.json', '.yaml', '.yml')
+
+# The directory of data files available to every page.
+GLOBAL_DIR = '_global'
+
+
+def load_json(filename):
+    with open(filename, 'rb') as f:
+        return json.loads(f.read().decode('utf-8'))
+
+
+def load_yaml(filename):
+    if yaml is None:
+        raise ValueError("PyYAML is needed to load %s." % filename)
+    loader = getattr(yaml, 'CSafeLoader', yaml.SafeLoader)
+    with open(filename, 'rb') as f:
+        return yaml.load(f, Loader=loader)
+
+
+LOADERS = {
+    '.json': load_json,
+    '.yaml': load_yaml,
+    '.yml': load_yaml,
+}
+
+
+class DataStore(object):
+    """
+    Loads the data files in root as template context.
+
+    A page's data comes from the file matching its path, so `/blog/post/`
+    gets the keys of `blog/post.json` or `blog/post/index.json`. Every
+    file in `_global` is available to all pages by its name, so
+    `_global/products.yaml` is `{{ products }}`.
+
+    Parsed data is kept until its file's modification time or size
+    changes.
+
+    """
+
+    def __init__(self, root):
+        self.root = os.path.abspath(root)
+        self._data = {}
+        self._globals = (None, [])
+        self._lock = threading.Lock()
+
+    def load(self, filename):
+        """
+        Returns the parsed contents of filename.
+
+        """
+        stat = os.stat(filename)
+        key = (stat.st_mtime, stat.st_size)
+        cached = self._data.get(filename)
+        if cached is not None and cached[0] == key:
+            return cached[1]
+        extension = os.path.splitext(filename)[1]
+        value = LOADERS[extension](filename)
+        with self._lock:
+            self._data[filename] = (key, value)
+        return value
+
+    def find(self, path):
+        """
+        Returns the filename of the data file for path, or None.
+
+        """
+        path = path.strip('/')
+        if path:
+            candidates = [path, os.path.join(path, 'index')]
+        else:
+            candidates = ['index']
+        for candidate in candidates:
+            for extension in EXTENSIONS:
+                filename = os.path.join(self.root, '%s%s' % (candidate, extension))
+                if os.path.isfile(filename):
+                    return filename
+        return None
+
+    def global_files(self):
+        """
+        Returns the filenames of the global data files.
+
+        """
+        global_dir = os.path.join(self.root, GLOBAL_DIR)
+        try:
+            mtime = os.stat(global_dir).st_mtime
+        except OSError:
+            return []
+        if self._globals[0] != mtime:
+            filenames = sorted(os.path.join(global_dir, name) for name in os.listdir(global_dir)
+                               if os.path.splitext(name)[1] in EXTENSIONS)
+            self._globals = (mtime, filenames)
+        return self._globals[1]
+
+    def files(self, path):
+        """
+        Returns the filenames of every data file path's context is built
+        from.
+
+        """
+        filenames = list(self.global_files())
+        filename = self.find(path)
+        if filename is not None:
+            filenames.append(filename)
+        return filenames
+
+    def context(self, path=None):
+        """
+        Returns a dict of the global data and, if path is given, the data
+        for path.
+
+        """
+        context = {}
+        for filename in self.global_files():
+            name = os.path.splitext(os.path.basename(filename))[0]
+            context[name] = self.load(filename)
+        filename = self.find(path) if path is not None else None
+        if filename is not None:
+            data = self.load(filename)
+            if not isinstance(data, dict):
+                raise ValueError("%s must contain a mapping." % filename)
+            context.update(data)
+        return context
+
+    def is_global(self, filename):
+        return os.path.dirname(os.path.abspath(filename)) == os.path.join(self.root, GLOBAL_DIR)
+
+    def page_path(self, filename):
+        """
+        Returns the request path whose data is stored in filename, or None
+        if it isn't a page data file.
+
+        """
+        filename = os.path.abspath(filename)
+        if not filename.startswith(self.root + os.sep):
+            return None
+        name, extension = os.path.splitext(os.path.relpath(filename, self.root))
+        if extension not in EXTENSIONS or self.is_global(filename):
+            return None
+        return templates.template_path('%s.html' % name)
@@ -0,0 +1,159 @@
+"""
+Per-application template engines for Django 1.4, which only has the
+global TEMPLATE_DIRS and TEMPLATE_LOADERS settings.
+
+Every application configures the same loader, which loads templates
+from whichever Engine is active in the current thread. Templates that
+extend or include others are rendered with their engine active, so
+those are found in the same application's template dirs.
+
+"""
+import os
+import threading
+from contextlib import contextmanager
+
+from django.template import TemplateDoesNotExist
+from django.template.loader import BaseLoader, get_template_from_string, make_origin
+
+from fugleman import templates
+from fugleman.cache import FragmentCache
+
+
+_local = threading.local()
+
+
+def get_engine():
+    """
+    Returns the engine active in this thread, or None.
+
+    """
+    engines = getattr(_local, 'engines', None)
+    if not engines:
+        return None
+    return engines[-1]
+
+
+class Engine(object):
+    """
+    Loads and compiles the templates in dirs, keeping the compiled
+    templates when cached is True.
+
+    The fragments rendered by `{% fugcache %}` tags are kept in the
+    engine's fragment cache, and `{% asset %}` tags link to static.
+
+    """
+
+    def __init__(self, dirs, cached=True, fragment_cache_size=1024, static=None):
+        self.dirs = list(dirs)
+        self.cached = cached
+        self.static = static
+        self.template_cache = {}
+        # The filename and modification time each cached template was
+        # compiled from.
+        self.sources = {}
+        # The templates loaded while compiling each cached template.
+        # Django compiles constant includes into the including template,
+        # so it has to go when they change.
+        self.includes = {}
+        self._local = threading.local()
+        self.fragments = FragmentCache(fragment_cache_size)
+
+    def load_template_source(self, name, dirs=None):
+        filename = templates.find_template(name, self.dirs)
+        if filename is None:
+            raise TemplateDoesNotExist(name)
+        return templates.read_template(filename), filename
+
+    def get_template(self, name):
+        """
+        Returns the compiled template called name.
+
+        """
+        compiling = getattr(self._local, 'compiling', None)
+        if compiling:
+            compiling[-1].add(name)
+        try:
+            return self.template_cache[name]
+        except KeyError:
+            pass
+        source, filename = self.load_template_source(name)
+        mtime = os.path.getmtime(filename)
+        origin = make_origin(filename, self.load_template_source, name, None)
+        if compiling is None:
+            compiling = self._local.compiling = []
+        compiling.append(set())
+        try:
+            with self.activated():
+                # Included templates are loaded while compiling.
+                template = get_template_from_string(source, origin, name)
+        finally:
+            loaded = compiling.pop()
+        if self.cached:
+            self.template_cache[name] = template
+            self.sources[name] = (filename, mtime)
+            self.includes[name] = loaded
+        return template
+
+    def forget(self, names):
+        """
+        Removes the templates called names from the cache, along with
+        the templates they were compiled into.
+
+        """
+        names = set(names)
+        pending = list(names)
+        while pending:
+            forgotten = pending.pop()
+            for name, loaded in list(self.includes.items()):
+                if forgotten in loaded and name not in names:
+                    names.add(name)
+                    pending.append(name)
+        for name in names:
+            self.template_cache.pop(name, None)
+            self.sources.pop(name, None)
+            self.includes.pop(name, None)
+
+    @contextmanager
+    def activated(self):
+        """
+        Makes this the engine templates are loaded from in this thread.
+
+        """
+        engines = getattr(_local, 'engines', None)
+        if engines is None:
+            engines = _local.engines = []
+        engines.append(self)
+        try:
+            yield
+        finally:
+            engines.pop()
+
+    def iter_activated(self, iterable):
+        """
+        Iterates over iterable with this engine active, for generators
+        that render templates and may be resumed in any thread.
+
+        """
+        iterator = iter(iterable)
+        while True:
+            with self.activated():
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    return
+            yield item
+
+
+class Loader(BaseLoader):
+    """
+    The template loader configured for every application, it loads
+    templates from the active engine.
+
+    """
+    is_usable = True
+
+    def load_template(self, template_name, template_dirs=None):
+        engine = get_engine()
+        if engine is None:
+            raise TemplateDoesNotExist(template_name)
+        return engine.get_template(template_name), None
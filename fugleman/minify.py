@@ -0,0 +1,38 @@
+import re
+
+
+# Elements whose contents are left exactly as they are.
+PRESERVED_RE = re.compile(r'<(pre|textarea|script|style)\b.*?</\1\s*>', re.IGNORECASE | re.DOTALL)
+
+# Comments, except conditional comments for old versions of IE.
+COMMENT_RE = re.compile(r'<!--(?!\[if|<!|>).*?-->', re.DOTALL)
+
+WHITESPACE_RE = re.compile(r'\s+')
+
+
+def collapse_whitespace(match):
+    # Browsers render any run of whitespace between inline content as a
+    # single space, keeping a line break keeps the source readable.
+    return '\n' if '\n' in match.group(0) else ' '
+
+
+def minify_html(html):
+    """
+    Returns html without comments and with every run of whitespace
+    collapsed to one character.
+
+    The contents of pre, textarea, script and style elements are left
+    alone, and a space is kept wherever there was whitespace, so the
+    page renders as before.
+
+    """
+    preserved = []
+
+    def preserve(match):
+        preserved.append(match.group(0))
+        return '\x00%d\x00' % (len(preserved) - 1)
+
+    html = PRESERVED_RE.sub(preserve, html)
+    html = COMMENT_RE.sub('', html)
+    html = WHITESPACE_RE.sub(collapse_whitespace, html).strip()
+    return re.sub('\x00(\\d+)\x00', lambda match: preserved[int(match.group(1))], html)
@@ -0,0 +1,135 @@
+import cProfile
+import os
+import sys
+from timeit import default_timer
+
+from django.template import Node
+
+
+def tag_function(node):
+    """
+    Returns the function a node made by a simple_tag, inclusion_tag or
+    assignment_tag calls, or None.
+
+    Django 1.4 defines a node class for each of those tags inside the
+    decorator, so the function is only in its render method's closure.
+
+    """
+    render = getattr(node.__class__, 'render', None)
+    render = getattr(render, '__func__', render)
+    code = getattr(render, '__code__', None)
+    closure = getattr(render, '__closure__', None)
+    if code is None or not closure or 'func' not in code.co_freevars:
+        return None
+    func = closure[code.co_freevars.index('func')].cell_contents
+    return getattr(func, '_decorated_function', func)
+
+
+def node_label(node):
+    """
+    Returns a label for a template node naming its class and, for
+    blocks, extends and includes, the block or template it refers to,
+    or for custom tags, the function they call.
+
+    """
+    name = node.__class__.__name__
+    for attr in ('name', 'parent_name', 'template_name'):
+        value = getattr(node, attr, None)
+        if value is not None:
+            return '%s(%s)' % (name, str(getattr(value, 'token', value)).strip('"\''))
+    func = tag_function(node)
+    if func is not None:
+        return '%s(%s)' % (name, func.__name__)
+    template = getattr(node, 'template', None)
+    if getattr(template, 'name', None) is not None:
+        return '%s(%s)' % (name, template.name)
+    return name
+
+
+class StackProfiler(object):
+    """
+    A deterministic profiler that records the time spent in every call
+    stack, with template nodes labelled by tag.
+
+    The stacks can be written in the collapsed format used by
+    flamegraph tools, and the cumulative time of each template node is
+    tracked so slow tags can be listed.
+
+    """
+
+    def __init__(self):
+        self.stacks = {}
+        self.nodes = {}
+        self._stack = []
+        self._labels = []
+
+    def label(self, frame):
+        code = frame.f_code
+        if code.co_name == 'render':
+            node = frame.f_locals.get('self')
+            if isinstance(node, Node):
+                return node_label(node), True
+        return '%s:%s' % (os.path.basename(code.co_filename), code.co_name), False
+
+    def trace(self, frame, event, arg):
+        if event == 'call':
+            label, is_node = self.label(frame)
+            self._labels.append(label)
+            self._stack.append([default_timer(), 0.0, is_node])
+        elif event == 'return' and self._stack:
+            start, children, is_node = self._stack.pop()
+            elapsed = default_timer() - start
+            key = ';'.join(self._labels)
+            label = self._labels.pop()
+            self.stacks[key] = self.stacks.get(key, 0.0) + elapsed - children
+            if self._stack:
+                self._stack[-1][1] += elapsed
+            # Recursive nodes only count once towards their cumulative time.
+            if is_node and label not in self._labels:
+                self.nodes[label] = self.nodes.get(label, 0.0) + elapsed
+
+    def runcall(self, func, *args, **kwargs):
+        sys.setprofile(self.trace)
+        try:
+            return func(*args, **kwargs)
+        finally:
+            sys.setprofile(None)
+
+    def write_collapsed(self, filename):
+        """
+        Writes the stacks with their self time in microseconds, one per
+        line, for flamegraph.pl and compatible tools.
+
+        """
+        with open(filename, 'w') as f:
+            for stack, duration in sorted(self.stacks.items()):
+                microseconds = int(duration * 1000000)
+                if microseconds:
+                    f.write('%s %d\n' % (stack, microseconds))
+
+    def top_nodes(self, count=20):
+        """
+        Returns (label, seconds) tuples for the template nodes with the
+        highest cumulative time.
+
+        """
+        return sorted(self.nodes.items(), key=lambda item: item[1], reverse=True)[:count]
+
+
+def profile(func, iterations, pstats_filename, collapsed_filename):
+    """
+    Calls func iterations times under cProfile and then under a
+    StackProfiler, writing a pstats file and a collapsed stack file.
+    Returns the StackProfiler.
+
+    """
+    profiler = cProfile.Profile()
+    for i in range(iterations):
+        profiler.runcall(func)
+    profiler.dump_stats(pstats_filename)
+
+    stack_profiler = StackProfiler()
+    for i in range(iterations):
+        stack_profiler.runcall(func)
+    stack_profiler.write_collapsed(collapsed_filename)
+    return stack_profiler
@@ -0,0 +1,79 @@
+import os
+import subprocess
+import sys
+import threading
+import time
+
+
+# The exit code a server process uses to ask to be restarted.
+RELOAD_EXIT_CODE = 3
+
+ENVIRON_KEY = 'FUGLEMAN_RUN_MAIN'
+
+
+def is_reloader_child():
+    """
+    Returns True in a process started by restart_with_reloader.
+
+    """
+    return os.environ.get(ENVIRON_KEY) == 'true'
+
+
+def restart_with_reloader():
+    """
+    Runs the current command in a child process, starting it again each
+    time it exits with RELOAD_EXIT_CODE, and returns its exit code.
+
+    """
+    environ = os.environ.copy()
+    environ[ENVIRON_KEY] = 'true'
+    while True:
+        exit_code = subprocess.call([sys.executable] + sys.argv, env=environ)
+        if exit_code != RELOAD_EXIT_CODE:
+            return exit_code
+
+
+def source_filename(module):
+    """
+    Returns the filename of the source a module was imported from.
+
+    """
+    filename = os.path.abspath(module.__file__)
+    if filename.endswith(('.pyc', '.pyo')):
+        filename = filename[:-1]
+    return filename
+
+
+def mtimes(filenames):
+    result = {}
+    for filename in filenames:
+        try:
+            result[filename] = os.stat(filename).st_mtime
+        except OSError:
+            result[filename] = None
+    return result
+
+
+def watch_files(filenames, interval=1.0):
+    """
+    Starts a thread that exits the process with RELOAD_EXIT_CODE as soon
+    as one of filenames changes.
+
+    Only Python code needs a restart, templates are picked up by the
+    application's own watcher, so this checks a handful of files rather
+    than everything in sys.modules.
+
+    """
+    def run():
+        initial = mtimes(filenames)
+        while True:
+            time.sleep(interval)
+            if mtimes(filenames) != initial:
+                # The server is blocked in the main thread, so leave
+                # without unwinding it.
+                os._exit(RELOAD_EXIT_CODE)
+
+    thread = threading.Thread(target=run)
+    thread.daemon = True
+    thread.start()
+    return thread
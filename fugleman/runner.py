@@ -1,8 +1,43 @@
 import os
 import sys
-from optparse import OptionParser
+from importlib import import_module
+from optparse import OptionParser, make_option
 
-from fugleman import commands, __version__
+from fugleman import __version__
+
+
+# The setuptools entry point group other packages add subcommands to.
+ENTRY_POINT_GROUP = 'fugleman.commands'
+
+
+def import_string(path):
+    """
+    Imports and returns the object at a dotted path like
+    `fugleman.commands.ServeCommand`.
+
+    """
+    module_name, name = path.rsplit('.', 1)
+    return getattr(import_module(module_name), name)
+
+
+def iter_entry_points(group):
+    """
+    Returns the entry points in group, using importlib.metadata where
+    it's available since pkg_resources is slow to import.
+
+    """
+    try:
+        from importlib.metadata import entry_points
+    except ImportError:
+        try:
+            import pkg_resources
+        except ImportError:
+            return []
+        return pkg_resources.iter_entry_points(group)
+    entry_points = entry_points()
+    if hasattr(entry_points, 'select'):
+        return entry_points.select(group=group)
+    return entry_points.get(group, [])
 
 
 class LaxOptionParser(OptionParser):
@@ -40,8 +75,21 @@ class LaxOptionParser(OptionParser):
 
 
 class CommandRunner(object):
+    """
+    Runs the subcommand named in argv.
+
+    Subcommands are given as dotted paths, or as classes, and are only
+    imported when they're run. Other packages can add subcommands with
+    entry points in the `fugleman.commands` group. Looking those up
+    imports pkg_resources on Python 2, which is slow, so it's only done
+    to run a name that isn't built in or for `help --plugins`.
+
+    """
     subcommands = {
-        'serve': commands.ServeCommand
+        'serve': 'fugleman.commands.ServeCommand',
+        'build': 'fugleman.commands.BuildCommand',
+        'bench': 'fugleman.commands.BenchCommand',
+        'profile': 'fugleman.commands.ProfileCommand',
     }
 
     def __init__(self, argv, stdout=sys.stdout):
@@ -51,11 +99,20 @@ class CommandRunner(object):
         self.parser = LaxOptionParser(
            usage='%s subcommand [options] [args]' % self.prog,
            version=__version__,
+           option_list=(
+               make_option('--plugins',
+                   dest='plugins',
+                   action='store_true',
+                   default=False,
+                   help='List the subcommands added by other packages too.',
+               ),
+           ),
         )
 
-    def print_help(self):
+    def print_help(self, plugins=False):
         """
-        Prints the programs help text to stdout.
+        Prints the programs help text to stdout, listing the subcommands
+        added by other packages too when plugins is True.
 
         """
         self.parser.print_help(self.stdout)
@@ -67,9 +124,15 @@ class CommandRunner(object):
             "Available subcommands:",
         ]
 
-        for subcommand_name in self.subcommands.keys():
+        for subcommand_name in sorted(self.subcommand_names(plugins)):
             text.append('  %s' % subcommand_name)
 
+        if not plugins:
+            text.extend([
+                "",
+                "Type '%s help --plugins' to include subcommands from other packages." % self.prog,
+            ])
+
         text.append('')
 
         self.stdout.write('\n'.join(text))
@@ -93,15 +156,40 @@ class CommandRunner(object):
         ]
         self.stdout.write('\n'.join(text))
 
+    def subcommand_names(self, plugins=False):
+        """
+        Returns the names of the built in subcommands, and those added by
+        entry points when plugins is True.
+
+        """
+        names = set(self.subcommands)
+        if plugins:
+            names.update(entry_point.name for entry_point in iter_entry_points(ENTRY_POINT_GROUP))
+        return names
+
+    def load_subcommand(self, name):
+        """
+        Returns the class of the subcommand called name, or None.
+
+        """
+        subcommand_class = self.subcommands.get(name)
+        if subcommand_class is None:
+            for entry_point in iter_entry_points(ENTRY_POINT_GROUP):
+                if entry_point.name == name:
+                    return entry_point.load()
+            return None
+        if isinstance(subcommand_class, str):
+            subcommand_class = import_string(subcommand_class)
+        return subcommand_class
+
     def fetch_subcommand(self, name):
         """
         Returns the subcommand if its found otherwise it prints
         an error message.
 
         """
-        try:
-            subcommand_class = self.subcommands[name]
-        except KeyError:
+        subcommand_class = self.load_subcommand(name)
+        if subcommand_class is None:
             self.print_command_unkown_error(name)
             sys.exit(1)
         return subcommand_class(self.prog, name, self.argv[2:], self.stdout)
@@ -121,9 +209,9 @@ class CommandRunner(object):
 
         if subcommand_name == 'help':
             if len(args) <= 2:
-                self.print_help()
+                self.print_help(options.plugins)
             else:
-                self.fetch_subcommand(self.argv[2]).print_help()
+                self.fetch_subcommand(args[2]).print_help()
         elif subcommand_name == 'version':
             self.print_version()
         else:
@@ -0,0 +1,150 @@
+import os
+import signal
+import socket
+import sys
+import threading
+import time
+import traceback
+
+from werkzeug.serving import BaseWSGIServer, WSGIRequestHandler
+
+
+# Workers that exit sooner than this after they're forked are respawned
+# with a delay that doubles each time, up to MAX_RESPAWN_DELAY seconds.
+MIN_WORKER_LIFETIME = 1.0
+MAX_RESPAWN_DELAY = 10.0
+
+
+class KeepAliveRequestHandler(WSGIRequestHandler):
+    """
+    A request handler that speaks HTTP/1.1 so clients can reuse their
+    connections.
+
+    """
+    protocol_version = 'HTTP/1.1'
+
+    # Idle keep-alive connections are dropped after this many seconds so
+    # they don't hold on to a thread forever.
+    timeout = 15
+
+
+class QuietRequestHandler(WSGIRequestHandler):
+    """
+    A request handler that only logs errors, for applications that keep
+    their own access log.
+
+    """
+
+    def log_request(self, code='-', size='-'):
+        pass
+
+
+class QuietKeepAliveRequestHandler(QuietRequestHandler, KeepAliveRequestHandler):
+    pass
+
+
+class ThreadPoolWSGIServer(BaseWSGIServer):
+    """
+    A WSGI server that handles connections in a fixed pool of threads.
+
+    Each thread accepts its own connections, so a connection is only
+    taken off the listening socket when a thread is free to handle it.
+    A busy worker process leaves new connections to idle ones.
+
+    The threads are started by serve_forever, so a server created before
+    forking gets its own pool in every process.
+
+    """
+    multithread = True
+
+    def __init__(self, host, port, app, threads=1, handler=KeepAliveRequestHandler):
+        BaseWSGIServer.__init__(self, host, port, app, handler)
+        self.threads = threads
+
+    def serve_forever(self):
+        for i in range(self.threads - 1):
+            thread = threading.Thread(target=self.process_connections)
+            thread.daemon = True
+            thread.start()
+        try:
+            self.process_connections()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.server_close()
+
+    def process_connections(self):
+        while True:
+            try:
+                request, client_address = self.get_request()
+            except socket.error:
+                continue
+            try:
+                self.finish_request(request, client_address)
+            except Exception:
+                self.handle_error(request, client_address)
+            finally:
+                self.shutdown_request(request)
+
+
+def serve(application, addr, port, workers=1, threads=1, handler=KeepAliveRequestHandler):
+    """
+    Serves application from workers processes forked from this one, each
+    handling connections with a pool of threads.
+
+    The listening socket is opened before forking so every worker
+    accepts from it, and the application is loaded once and shared.
+    Workers that die are replaced until the server is interrupted or
+    terminated, waiting longer each time workers die soon after they
+    start so a broken application doesn't fork in a tight loop.
+
+    """
+    server = ThreadPoolWSGIServer(addr, port, application, threads, handler)
+    if workers == 1:
+        server.serve_forever()
+        return
+
+    children = {}
+
+    def spawn():
+        pid = os.fork()
+        if pid == 0:
+            signal.signal(signal.SIGTERM, signal.SIG_DFL)
+            try:
+                post_fork = getattr(application, 'post_fork', None)
+                if post_fork is not None:
+                    post_fork()
+                server.serve_forever()
+            except Exception:
+                traceback.print_exc()
+                os._exit(1)
+            finally:
+                os._exit(0)
+        children[pid] = time.time()
+
+    for i in range(workers):
+        spawn()
+
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    delay = 0
+    try:
+        while True:
+            pid, status = os.wait()
+            started = children.pop(pid, None)
+            if started is not None and time.time() - started < MIN_WORKER_LIFETIME:
+                delay = min(max(delay * 2, 0.1), MAX_RESPAWN_DELAY)
+                time.sleep(delay)
+            else:
+                delay = 0
+            spawn()
+    finally:
+        for pid in children:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except OSError:
+                pass  # Already gone
+        for pid in children:
+            try:
+                os.waitpid(pid, 0)
+            except OSError:
+                pass
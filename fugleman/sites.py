@@ -0,0 +1,79 @@
+from werkzeug.exceptions import NotFound
+from werkzeug.utils import redirect
+from werkzeug.wsgi import pop_path_info
+
+
+class Sites(object):
+    """
+    Serves many applications from one process, choosing one for each
+    request by its host name or by the first segment of its path.
+
+    `hosts` maps host names to applications and `prefixes` maps path
+    prefixes such as `/blog` to applications, which see the rest of the
+    path. Hosts are tried first, then prefixes, then `default`.
+
+    """
+
+    def __init__(self, hosts=None, prefixes=None, default=None):
+        self.hosts = dict((host.lower(), application)
+                          for host, application in (hosts or {}).items())
+        self.prefixes = dict((prefix.strip('/'), application)
+                             for prefix, application in (prefixes or {}).items())
+        self.default = default
+
+    @property
+    def applications(self):
+        applications = list(self.hosts.values()) + list(self.prefixes.values())
+        if self.default is not None:
+            applications.append(self.default)
+        unique = []
+        for application in applications:
+            if not any(application is seen for seen in unique):
+                unique.append(application)
+        return unique
+
+    def __call__(self, environ, start_response):
+        application = self.find(environ)
+        if application is None:
+            return NotFound()(environ, start_response)
+        if not environ.get('PATH_INFO'):
+            # A bare prefix, send the client to its index.
+            return redirect('%s/' % environ['SCRIPT_NAME'])(environ, start_response)
+        return application(environ, start_response)
+
+    def find(self, environ):
+        """
+        Returns the application for the request in environ, moving a
+        matched path prefix into SCRIPT_NAME.
+
+        """
+        host = environ.get('HTTP_HOST') or environ.get('SERVER_NAME', '')
+        application = self.hosts.get(host.split(':')[0].lower())
+        if application is not None:
+            return application
+        path = environ.get('PATH_INFO', '')
+        prefix = path.lstrip('/').split('/', 1)[0]
+        if prefix and prefix in self.prefixes:
+            pop_path_info(environ)
+            return self.prefixes[prefix]
+        return self.default
+
+    def post_fork(self):
+        for application in self.applications:
+            post_fork = getattr(application, 'post_fork', None)
+            if post_fork is not None:
+                post_fork()
+
+    def warmup(self):
+        """
+        Warms up every application, returning the total number of
+        templates compiled and how long it took.
+
+        """
+        count = 0
+        duration = 0.0
+        for application in self.applications:
+            compiled, elapsed = application.warmup()
+            count += compiled
+            duration += elapsed
+        return count, duration
@@ -0,0 +1,314 @@
+import hashlib
+import json
+import mimetypes
+import os
+import re
+import time
+from datetime import datetime
+
+from werkzeug.http import is_resource_modified
+from werkzeug.wrappers import Response
+from werkzeug.wsgi import wrap_file
+
+
+# Matches names with a content hash in them, like `site.3f2a1b9c.css`.
+FINGERPRINT_RE = re.compile(r'\.[0-9a-f]{8,}\.[^./]+$')
+
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+
+
+def iter_file_range(f, start, stop, buffer_size=8192):
+    """
+    Yields the bytes of f from start up to stop and closes it.
+
+    """
+    try:
+        f.seek(start)
+        remaining = stop - start
+        while remaining > 0:
+            chunk = f.read(min(buffer_size, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+    finally:
+        f.close()
+
+
+def hash_file(filename, buffer_size=64 * 1024):
+    """
+    Returns a hex digest of the contents of filename.
+
+    """
+    digest = hashlib.sha1()
+    with open(filename, 'rb') as f:
+        while True:
+            chunk = f.read(buffer_size)
+            if not chunk:
+                break
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def fingerprint_name(name, digest):
+    """
+    Returns name with the first 12 characters of digest inserted before
+    its extension, like `css/site.3f2a1b9c0d4e.css`.
+
+    """
+    base, extension = os.path.splitext(name)
+    return '%s.%s%s' % (base, digest[:12], extension)
+
+
+class AssetManifest(object):
+    """
+    Maps the names of the files in root to fingerprinted names with a
+    hash of their contents in them.
+
+    Files that already have a fingerprint in their name are left out.
+    The fingerprints a file had before it changed still resolve to it,
+    so pages that link to them don't break.
+
+    `modified` is the time the fingerprints last changed, which pages
+    linking to them have to be treated as modified at too.
+
+    """
+
+    def __init__(self, root):
+        self.root = os.path.abspath(root)
+        self.names = {}
+        self.originals = {}
+        self.stats = {}
+        self.modified = 0
+        self.checked = 0
+        self.refresh()
+
+    def name(self, filename):
+        return os.path.relpath(filename, self.root).replace(os.sep, '/')
+
+    def filename(self, name):
+        return os.path.join(self.root, *name.split('/'))
+
+    def walk(self):
+        """
+        Returns the names of the files in root that can be fingerprinted.
+
+        """
+        names = []
+        for root, dirnames, filenames in os.walk(self.root):
+            for filename in filenames:
+                name = self.name(os.path.join(root, filename))
+                if not FINGERPRINT_RE.search(name):
+                    names.append(name)
+        return names
+
+    def refresh(self):
+        """
+        Hashes every file in root.
+
+        """
+        self.update_names(self.walk())
+        self.modified = max([stat[0] for stat in self.stats.values()] or [0])
+
+    def update(self, filenames):
+        """
+        Hashes filenames again, for when they were added, changed or
+        removed. Returns True if any fingerprint changed.
+
+        """
+        names = []
+        for filename in filenames:
+            filename = os.path.abspath(filename)
+            if not filename.startswith(self.root + os.sep):
+                continue
+            if os.path.isdir(filename):
+                return self.update_names(self.walk() + list(self.names))
+            names.append(self.name(filename))
+        return self.update_names(names)
+
+    def update_names(self, names):
+        current = dict(self.names)
+        changed = False
+        for name in names:
+            try:
+                stat = os.stat(self.filename(name))
+            except OSError:
+                stat = None
+            if stat is None or FINGERPRINT_RE.search(name):
+                changed = current.pop(name, None) is not None or changed
+                self.stats.pop(name, None)
+                continue
+            key = (stat.st_mtime, stat.st_size)
+            if self.stats.get(name) == key and name in current:
+                continue
+            hashed = fingerprint_name(name, hash_file(self.filename(name)))
+            self.stats[name] = key
+            if current.get(name) != hashed:
+                current[name] = hashed
+                self.originals[hashed] = name
+                changed = True
+        self.names = current
+        if changed:
+            self.modified = time.time()
+        return changed
+
+    def poll(self, interval=1.0):
+        """
+        Checks root for changes at most once every interval seconds, for
+        when nothing watches it. Returns True if any fingerprint changed.
+
+        """
+        now = time.time()
+        if now - self.checked < interval:
+            return False
+        self.checked = now
+        return self.update_names(self.walk() + list(self.names))
+
+    def is_current(self, hashed):
+        """
+        Returns True if hashed is the fingerprint of its file as it is
+        now.
+
+        This doesn't update the manifest, a file that changed since it
+        was hashed is just not current until the watcher or poll() hashes
+        it again and the pages linking to it are invalidated.
+
+        """
+        name = self.originals.get(hashed)
+        if name is None or self.names.get(name) != hashed:
+            return False
+        try:
+            stat = os.stat(self.filename(name))
+        except OSError:
+            return False
+        return self.stats.get(name) == (stat.st_mtime, stat.st_size)
+
+    def save(self, filename):
+        with open(filename, 'w') as f:
+            json.dump(self.names, f, indent=2, sort_keys=True)
+
+
+class StaticFiles(object):
+    """
+    Serves the files in root at url.
+
+    Whole files are handed to the server's `wsgi.file_wrapper` so it can
+    use sendfile, single byte ranges are supported and fingerprinted
+    names are cached by clients forever.
+
+    With fingerprint, every file is also served at a name with a hash of
+    its contents in it, which the `{% asset %}` template tag links to.
+
+    """
+
+    def __init__(self, root, url='/static/', fingerprint=False):
+        self.root = os.path.abspath(root)
+        self.url = url
+        if fingerprint:
+            self.manifest = AssetManifest(self.root)
+        else:
+            self.manifest = None
+
+    def asset_url(self, name):
+        """
+        Returns the URL for the file called name, fingerprinted if it can
+        be.
+
+        """
+        if self.manifest is not None:
+            name = self.manifest.names.get(name, name)
+        return '%s%s' % (self.url, name)
+
+    def find(self, path):
+        """
+        Returns the filename for a request path, or None if it isn't a
+        file in root.
+
+        """
+        if not path.startswith(self.url):
+            return None
+        name = path[len(self.url):]
+        if self.manifest is not None:
+            # Fingerprinted names are served from the file they're of.
+            name = self.manifest.originals.get(name, name)
+        filename = os.path.normpath(os.path.join(self.root, *name.split('/')))
+        if not filename.startswith(self.root + os.sep) or not os.path.isfile(filename):
+            return None
+        return filename
+
+    def serve(self, request):
+        """
+        Returns a response for the file at the request path, or None if
+        there isn't one.
+
+        """
+        filename = self.find(request.path)
+        if filename is None:
+            return None
+
+        stat = os.stat(filename)
+        length = stat.st_size
+        etag = '%x-%x' % (int(stat.st_mtime), length)
+        last_modified = datetime.utcfromtimestamp(int(stat.st_mtime))
+        headers = {'Accept-Ranges': 'bytes'}
+        if self.is_immutable(request.path[len(self.url):]):
+            headers['Cache-Control'] = IMMUTABLE_CACHE_CONTROL
+        else:
+            headers['Cache-Control'] = 'no-cache'
+        mimetype = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+
+        if not is_resource_modified(request.environ, etag, last_modified=last_modified):
+            response = Response(status=304, headers=headers, mimetype=mimetype)
+        else:
+            response = self.file_response(request, filename, length, etag, last_modified,
+                                          headers, mimetype)
+        response.set_etag(etag)
+        response.last_modified = last_modified
+        return response
+
+    def is_immutable(self, name):
+        """
+        Returns True if the file called name will never change.
+
+        An old fingerprint of a file that has changed since is still
+        served, but not as immutable.
+
+        """
+        if self.manifest is not None and name in self.manifest.originals:
+            return self.manifest.is_current(name)
+        return bool(FINGERPRINT_RE.search(name))
+
+    def file_response(self, request, filename, length, etag, last_modified, headers, mimetype):
+        byte_range = None
+        if request.range is not None and self.range_matches(request, etag, last_modified):
+            byte_range = request.range.range_for_length(length)
+            if byte_range is None and len(request.range.ranges) == 1:
+                headers['Content-Range'] = 'bytes */%d' % length
+                return Response(status=416, headers=headers, mimetype=mimetype)
+
+        f = open(filename, 'rb')
+        if byte_range is None:
+            headers['Content-Length'] = str(length)
+            body = wrap_file(request.environ, f)
+            status = 200
+        else:
+            start, stop = byte_range
+            headers['Content-Length'] = str(stop - start)
+            headers['Content-Range'] = 'bytes %d-%d/%d' % (start, stop - 1, length)
+            body = iter_file_range(f, start, stop)
+            status = 206
+        return Response(body, status=status, headers=headers, mimetype=mimetype,
+                        direct_passthrough=True)
+
+    def range_matches(self, request, etag, last_modified):
+        """
+        Returns False if the request has an If-Range that no longer
+        matches the file, in which case the whole file is sent.
+
+        """
+        if_range = request.if_range
+        if if_range.etag is not None:
+            return if_range.etag == etag
+        if if_range.date is not None:
+            return if_range.date == last_modified
+        return True
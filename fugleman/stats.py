@@ -0,0 +1,115 @@
+import threading
+from bisect import bisect_left
+from timeit import default_timer
+
+
+# The upper bounds in seconds of the histogram buckets.
+BUCKETS = (0.0001, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+
+PHASES = ('parse', 'resolve', 'load', 'render', 'encode')
+
+
+class Timings(object):
+    """
+    Times the phases of handling a single request.
+
+    Each call to mark ends the current phase, so the phases cover the
+    whole request without gaps.
+
+    """
+
+    def __init__(self):
+        self.start = self.last = default_timer()
+        self.phases = {}
+
+    def mark(self, phase):
+        now = default_timer()
+        self.phases[phase] = self.phases.get(phase, 0.0) + now - self.last
+        self.last = now
+
+    @property
+    def total(self):
+        return self.last - self.start
+
+    def server_timing(self):
+        """
+        Returns the phases formatted for a Server-Timing header.
+
+        """
+        return ', '.join('%s;dur=%.3f' % (phase, self.phases[phase] * 1000)
+                         for phase in PHASES if phase in self.phases)
+
+
+class NullTimings(object):
+    """
+    Stands in for Timings when nothing is being measured.
+
+    """
+    phases = {}
+    total = 0.0
+
+    def mark(self, phase):
+        pass
+
+
+NULL_TIMINGS = NullTimings()
+
+
+class Histogram(object):
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(BUCKETS, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class Stats(object):
+    """
+    Aggregates request timings into histograms per phase and renders
+    them in the Prometheus text format.
+
+    """
+
+    def __init__(self):
+        self.histograms = dict((phase, Histogram()) for phase in PHASES + ('total',))
+        self._lock = threading.Lock()
+
+    def record(self, timings):
+        with self._lock:
+            for phase, duration in timings.phases.items():
+                self.histograms[phase].observe(duration)
+            self.histograms['total'].observe(timings.total)
+
+    def render(self, cache=None):
+        """
+        Returns the histograms, and the counters of cache if given, in the
+        Prometheus text format.
+
+        """
+        lines = [
+            '# HELP fugleman_request_phase_seconds Time spent in each phase of a request.',
+            '# TYPE fugleman_request_phase_seconds histogram',
+        ]
+        with self._lock:
+            for phase in PHASES + ('total',):
+                histogram = self.histograms[phase]
+                cumulative = 0
+                for bound, count in zip(BUCKETS + ('+Inf',), histogram.counts):
+                    cumulative += count
+                    lines.append('fugleman_request_phase_seconds_bucket{phase="%s",le="%s"} %d' % (
+                        phase, bound, cumulative))
+                lines.append('fugleman_request_phase_seconds_sum{phase="%s"} %f' % (phase, histogram.sum))
+                lines.append('fugleman_request_phase_seconds_count{phase="%s"} %d' % (phase, histogram.count))
+
+        if cache is not None:
+            for name, value in sorted(cache.stats().items()):
+                lines.append('# TYPE fugleman_page_cache_%s gauge' % name)
+                lines.append('fugleman_page_cache_%s %d' % (name, value))
+
+        lines.append('')
+        return '\n'.join(lines)
@@ -0,0 +1,155 @@
+"""
+Renders Django templates as a stream of chunks instead of one string.
+
+Django 1.4 templates only render whole, so the nodes that make up most
+of a large page, extends, block and for, are walked here the way their
+render methods would walk them. Every other node is rendered whole.
+
+"""
+from django.template.base import Node, TextNode, VariableDoesNotExist
+from django.template.defaulttags import ForNode
+# loader_tags imports the loader, which fails unless it's imported first.
+from django.template import loader  # NOQA
+from django.template.loader_tags import BLOCK_CONTEXT_KEY, BlockContext, BlockNode, ExtendsNode
+from django.utils.encoding import force_unicode
+
+
+def iter_render(template, context):
+    """
+    Renders template with context, yielding the output in pieces as it
+    goes.
+
+    """
+    context.render_context.push()
+    try:
+        for chunk in iter_nodelist(template.nodelist, context):
+            yield chunk
+    finally:
+        context.render_context.pop()
+
+
+def iter_encoded(chunks, chunk_size=64 * 1024, encoding='utf-8'):
+    """
+    Encodes the rendered pieces in chunks, joining them into blocks of at
+    least chunk_size bytes so small nodes aren't written one at a time.
+
+    """
+    buf = []
+    size = 0
+    for chunk in chunks:
+        chunk = chunk.encode(encoding)
+        buf.append(chunk)
+        size += len(chunk)
+        if size >= chunk_size:
+            yield b''.join(buf)
+            buf = []
+            size = 0
+    if buf:
+        yield b''.join(buf)
+
+
+def iter_nodelist(nodelist, context):
+    for node in nodelist:
+        if isinstance(node, ExtendsNode):
+            chunks = iter_extends(node, context)
+        elif isinstance(node, BlockNode):
+            chunks = iter_block(node, context)
+        elif isinstance(node, ForNode):
+            chunks = iter_for(node, context)
+        elif isinstance(node, Node):
+            chunks = [nodelist.render_node(node, context)]
+        else:
+            chunks = [node]
+        for chunk in chunks:
+            yield force_unicode(chunk)
+
+
+def iter_extends(node, context):
+    # Mirrors ExtendsNode.render.
+    compiled_parent = node.get_parent(context)
+    if BLOCK_CONTEXT_KEY not in context.render_context:
+        context.render_context[BLOCK_CONTEXT_KEY] = BlockContext()
+    block_context = context.render_context[BLOCK_CONTEXT_KEY]
+    block_context.add_blocks(node.blocks)
+    for parent_node in compiled_parent.nodelist:
+        if not isinstance(parent_node, TextNode):
+            if not isinstance(parent_node, ExtendsNode):
+                blocks = dict((n.name, n) for n in
+                              compiled_parent.nodelist.get_nodes_by_type(BlockNode))
+                block_context.add_blocks(blocks)
+            break
+    for chunk in iter_nodelist(compiled_parent.nodelist, context):
+        yield chunk
+
+
+def iter_block(node, context):
+    # Mirrors BlockNode.render.
+    block_context = context.render_context.get(BLOCK_CONTEXT_KEY)
+    context.push()
+    push = None
+    if block_context is None:
+        context['block'] = node
+        block = node
+    else:
+        push = block = block_context.pop(node.name)
+        if block is None:
+            block = node
+        block = BlockNode(block.name, block.nodelist)
+        block.context = context
+        context['block'] = block
+    for chunk in iter_nodelist(block.nodelist, context):
+        yield chunk
+    if push is not None:
+        block_context.push(node.name, push)
+    context.pop()
+
+
+def iter_for(node, context):
+    # Mirrors ForNode.render, yielding each pass through the loop.
+    if 'forloop' in context:
+        parentloop = context['forloop']
+    else:
+        parentloop = {}
+    context.push()
+    try:
+        values = node.sequence.resolve(context, True)
+    except VariableDoesNotExist:
+        values = []
+    if values is None:
+        values = []
+    if not hasattr(values, '__len__'):
+        values = list(values)
+    len_values = len(values)
+    if len_values < 1:
+        context.pop()
+        for chunk in iter_nodelist(node.nodelist_empty, context):
+            yield chunk
+        return
+    if node.is_reversed:
+        values = reversed(values)
+    unpack = len(node.loopvars) > 1
+    loop_dict = context['forloop'] = {'parentloop': parentloop}
+    for i, item in enumerate(values):
+        loop_dict['counter0'] = i
+        loop_dict['counter'] = i + 1
+        loop_dict['revcounter'] = len_values - i
+        loop_dict['revcounter0'] = len_values - i - 1
+        loop_dict['first'] = (i == 0)
+        loop_dict['last'] = (i == len_values - 1)
+
+        pop_context = False
+        if unpack:
+            try:
+                unpacked_vars = dict(zip(node.loopvars, item))
+            except TypeError:
+                pass
+            else:
+                pop_context = True
+                context.update(unpacked_vars)
+        else:
+            context[node.loopvars[0]] = item
+        for chunk in iter_nodelist(node.nodelist_loop, context):
+            yield chunk
+        if pop_context:
+            context.pop()
+    context.pop()
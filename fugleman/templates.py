@@ -0,0 +1,197 @@
+import codecs
+import hashlib
+import os
+import re
+import time
+
+
+DEPENDENCY_RE = re.compile(r"""{%\s*(?:extends|include)\s+(["'])(?P<name>[^"']+)\1""")
+
+
+def find_template(name, dirs):
+    """
+    Returns the absolute filename of the first template in dirs
+    matching name, or None if it can't be found.
+
+    """
+    for template_dir in dirs:
+        filename = os.path.abspath(os.path.join(template_dir, name))
+        if os.path.isfile(filename):
+            return filename
+    return None
+
+
+def read_template(filename):
+    """
+    Returns the source of the template stored at filename.
+
+    """
+    with codecs.open(filename, 'r', 'utf-8', 'replace') as f:
+        return f.read()
+
+
+def hash_template(filename):
+    """
+    Returns a hex digest of the contents of the template at filename.
+
+    """
+    with open(filename, 'rb') as f:
+        return hashlib.sha1(f.read()).hexdigest()
+
+
+def parse_dependencies(source):
+    """
+    Returns the names of the templates a template source extends or
+    includes.
+
+    Only constant names are found, `{% include name_var %}` can't be
+    resolved without rendering the template.
+
+    """
+    return [match.group('name') for match in DEPENDENCY_RE.finditer(source)]
+
+
+def find_dependencies(name, dirs):
+    """
+    Returns a dict mapping the filename of the template and every
+    template it extends or includes to its modification time.
+
+    """
+    dependencies = {}
+    seen = set()
+    pending = [name]
+    while pending:
+        name = pending.pop()
+        if name in seen:
+            continue
+        seen.add(name)
+        filename = find_template(name, dirs)
+        if filename is None:
+            continue
+        dependencies[filename] = os.path.getmtime(filename)
+        pending.extend(parse_dependencies(read_template(filename)))
+    return dependencies
+
+
+def template_name(filename, dirs):
+    """
+    Returns the name of the template at filename, or None if it isn't
+    in any of dirs.
+
+    """
+    filename = os.path.abspath(filename)
+    for template_dir in dirs:
+        template_dir = os.path.abspath(template_dir)
+        if filename.startswith(template_dir + os.sep):
+            return os.path.relpath(filename, template_dir).replace(os.sep, '/')
+    return None
+
+
+def template_path(name):
+    """
+    Returns the request path Application serves the template name at.
+
+    """
+    name = name.replace(os.sep, '/')[:-len('.html')]
+    if name == 'index' or name.endswith('/index'):
+        name = name[:-len('index')]
+    else:
+        name = '%s/' % name
+    return '/%s' % name
+
+
+def find_paths(dirs):
+    """
+    Returns a sorted list of every request path the templates in dirs
+    can serve.
+
+    """
+    paths = set()
+    for template_dir in dirs:
+        for root, dirnames, filenames in os.walk(template_dir):
+            for filename in filenames:
+                if filename.endswith('.html'):
+                    name = os.path.relpath(os.path.join(root, filename), template_dir)
+                    paths.add(template_path(name))
+    return sorted(paths)
+
+
+def find_routes(dirs):
+    """
+    Returns a dict mapping every request path the templates in dirs can
+    serve to a tuple of the template name and filename serving it.
+
+    Mirrors the lookup order of Application.template_names, `foo.html`
+    wins over `foo/index.html` and earlier dirs win over later ones.
+
+    """
+    candidates = {}
+    for template_dir in reversed(dirs):
+        for root, dirnames, filenames in os.walk(template_dir):
+            for filename in filenames:
+                if not filename.endswith('.html'):
+                    continue
+                filename = os.path.abspath(os.path.join(root, filename))
+                name = os.path.relpath(filename, template_dir).replace(os.sep, '/')
+                candidates[('/%s/' % name[:-len('.html')], 0)] = (name, filename)
+                if name == 'index.html' or name.endswith('/index.html'):
+                    candidates[(template_path(name), 1)] = (name, filename)
+
+    routes = {}
+    for (path, priority), route in sorted(candidates.items(), reverse=True):
+        routes[path] = route
+    return routes
+
+
+class RouteIndex(object):
+    """
+    An index of the request paths the templates in dirs can serve.
+
+    """
+
+    def __init__(self, dirs):
+        self.dirs = dirs
+        self.refresh()
+
+    def __contains__(self, path):
+        return path in self.routes
+
+    def __len__(self):
+        return len(self.routes)
+
+    def get(self, path):
+        """
+        Returns a tuple of the template name and filename serving path,
+        or None if no template can serve it.
+
+        """
+        return self.routes.get(path)
+
+    def find(self, name):
+        """
+        Returns the filename of the template name, or None if it isn't
+        in the index.
+
+        """
+        return self.filenames.get(name)
+
+    def refresh(self):
+        """
+        Rebuilds the index from the template dirs.
+
+        """
+        routes = find_routes(self.dirs)
+        self.filenames = dict(routes.values())
+        self.routes = routes
+        self.checked = time.time()
+
+    def poll(self, interval=1.0):
+        """
+        Rebuilds the index unless it was built in the last interval
+        seconds, and returns whether it was.
+
+        """
+        if time.time() - self.checked < interval:
+            return False
+        self.refresh()
+        return True
@@ -0,0 +1,89 @@
+from __future__ import absolute_import
+
+import itertools
+
+from django import template
+from django.utils.encoding import force_unicode
+
+from fugleman.engine import get_engine
+
+
+register = template.Library()
+
+# Every compiled fugcache tag gets its own token, so a template that's
+# compiled again after it changes doesn't reuse the old fragments.
+_tokens = itertools.count()
+
+
+class FugCacheNode(template.Node):
+
+    def __init__(self, nodelist, name, timeout, vary_on):
+        self.nodelist = nodelist
+        self.name = name
+        self.timeout = timeout
+        self.vary_on = vary_on
+        self.token = next(_tokens)
+
+    def render(self, context):
+        engine = get_engine()
+        if engine is None:
+            return self.nodelist.render(context)
+        key = (self.token, self.name) + tuple(force_unicode(var.resolve(context))
+                                              for var in self.vary_on)
+        content = engine.fragments.get(key)
+        if content is None:
+            content = self.nodelist.render(context)
+            try:
+                timeout = int(self.timeout.resolve(context))
+            except (ValueError, TypeError):
+                raise template.TemplateSyntaxError(
+                    "'fugcache' tag got a non-integer timeout value: %r" % self.timeout.token)
+            engine.fragments.set(key, content, timeout)
+        return content
+
+
+@register.tag
+def fugcache(parser, token):
+    """
+    Caches the rendered contents of the block.
+
+    Usage::
+
+        {% load fugleman %}
+        {% fugcache name timeout [var1 var2 ...] %}
+            ... expensive fragment ...
+        {% endfugcache %}
+
+    The fragment is cached for timeout seconds, or until it's evicted
+    when timeout is 0, and one copy is kept for every combination of
+    the extra variables. The cache is cleared when the template the tag
+    is in changes.
+
+    """
+    bits = token.split_contents()
+    if len(bits) < 3:
+        raise template.TemplateSyntaxError("'%s' tag requires at least 2 arguments." % bits[0])
+    nodelist = parser.parse(('endfugcache',))
+    parser.delete_first_token()
+    name = bits[1].strip('"\'')
+    return FugCacheNode(nodelist, name, parser.compile_filter(bits[2]),
+                        [parser.compile_filter(bit) for bit in bits[3:]])
+
+
+@register.simple_tag(takes_context=True)
+def asset(context, name):
+    """
+    Returns the URL of the static file called name, with a hash of its
+    contents in it so clients can cache it forever, under the prefix the
+    application is served at.
+
+    Usage::
+
+        {% load fugleman %}
+        <link rel="stylesheet" href="{% asset "css/site.css" %}">
+
+    """
+    engine = get_engine()
+    if engine is None or engine.static is None:
+        return name
+    return '%s%s' % (context.get('script_root', ''), engine.static.asset_url(name))
@@ -0,0 +1,242 @@
+import atexit
+import ctypes
+import ctypes.util
+import errno
+import os
+import select
+import struct
+import sys
+import threading
+import time
+import traceback
+
+try:
+    _libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+    _libc.inotify_init1
+except (OSError, AttributeError):
+    _libc = None
+
+
+class Watcher(threading.Thread):
+    """
+    A background thread that polls directories for changes.
+
+    The directories are polled every interval seconds and callback is
+    called with the set of filenames that were added, changed or
+    removed since the last poll.
+
+    """
+
+    def __init__(self, dirs, callback, interval=1.0):
+        threading.Thread.__init__(self)
+        self.daemon = True
+        self.dirs = dirs
+        self.callback = callback
+        self.interval = interval
+        self.mtimes = self.snapshot()
+        self._stopped = threading.Event()
+
+    def snapshot(self):
+        """
+        Returns a dict mapping the files in the watched directories to
+        their modification times.
+
+        """
+        mtimes = {}
+        for watched_dir in self.dirs:
+            for root, dirnames, filenames in os.walk(watched_dir):
+                for filename in filenames:
+                    filename = os.path.join(root, filename)
+                    try:
+                        mtimes[filename] = os.stat(filename).st_mtime
+                    except OSError:
+                        pass  # Removed while walking
+        return mtimes
+
+    def poll(self):
+        """
+        Returns the set of filenames that changed since the last poll.
+
+        """
+        mtimes = self.snapshot()
+        changed = set()
+        for filename in set(mtimes) | set(self.mtimes):
+            if mtimes.get(filename) != self.mtimes.get(filename):
+                changed.add(filename)
+        self.mtimes = mtimes
+        return changed
+
+    def start(self):
+        # Stop polling before the interpreter starts tearing down modules.
+        atexit.register(self.stop)
+        threading.Thread.start(self)
+
+    def run(self):
+        while not self._stopped.wait(self.interval):
+            changed = self.poll()
+            if changed:
+                self.notify(changed)
+
+    def notify(self, changed):
+        """
+        Passes changed to the callback. Errors are printed rather than
+        raised, so one failed callback doesn't stop the watcher.
+
+        """
+        try:
+            self.callback(changed)
+        except Exception:
+            traceback.print_exc()
+
+    def stop(self):
+        self._stopped.set()
+        if self.is_alive() and threading.current_thread() is not self:
+            self.join()
+
+
+class InotifyWatcher(Watcher):
+    """
+    A watcher that's told about changes by inotify instead of polling,
+    so they're seen as soon as they happen without walking the
+    directories. Linux only.
+
+    Changes are collected for `delay` seconds after the first one so an
+    editor saving a file in several steps triggers a single callback.
+    Directories that are removed or moved away are reported by their own
+    path, not the files inside them.
+
+    """
+    IN_MODIFY = 0x2
+    IN_ATTRIB = 0x4
+    IN_CLOSE_WRITE = 0x8
+    IN_MOVED_FROM = 0x40
+    IN_MOVED_TO = 0x80
+    IN_CREATE = 0x100
+    IN_DELETE = 0x200
+    IN_Q_OVERFLOW = 0x4000
+    IN_IGNORED = 0x8000
+    IN_ISDIR = 0x40000000
+    IN_NONBLOCK = os.O_NONBLOCK
+    IN_CLOEXEC = 0x80000
+
+    MASK = (IN_MODIFY | IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO |
+            IN_CREATE | IN_DELETE)
+    EVENT = struct.Struct('iIII')
+
+    delay = 0.05
+
+    def __init__(self, dirs, callback, interval=1.0):
+        if _libc is None:
+            raise OSError(errno.ENOSYS, "inotify isn't available")
+        self.fd = _libc.inotify_init1(self.IN_NONBLOCK | self.IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        self.watches = {}
+        try:
+            Watcher.__init__(self, dirs, callback, interval)
+        except OSError:
+            os.close(self.fd)
+            raise
+
+    def snapshot(self):
+        # Adds the watches instead of recording mtimes.
+        for watched_dir in self.dirs:
+            self.add_watches(watched_dir)
+        return {}
+
+    def add_watches(self, path):
+        """
+        Watches path and every directory below it, returning the files
+        already in them.
+
+        """
+        filenames = set()
+        for root, dirnames, names in os.walk(path):
+            encoded = root if isinstance(root, bytes) else root.encode(sys.getfilesystemencoding())
+            wd = _libc.inotify_add_watch(self.fd, encoded, self.MASK)
+            if wd < 0:
+                error = ctypes.get_errno()
+                if error == errno.ENOENT:
+                    continue  # Removed while walking
+                raise OSError(error, "Could not watch %s" % root)
+            self.watches[wd] = root
+            filenames.update(os.path.join(root, name) for name in names)
+        return filenames
+
+    def read_events(self):
+        data = []
+        while True:
+            try:
+                chunk = os.read(self.fd, 64 * 1024)
+            except OSError as e:
+                if e.errno == errno.EAGAIN:
+                    break
+                raise
+            if not chunk:
+                break
+            data.append(chunk)
+        data = b''.join(data)
+        offset = 0
+        while offset < len(data):
+            wd, mask, cookie, length = self.EVENT.unpack_from(data, offset)
+            offset += self.EVENT.size
+            name = data[offset:offset + length].rstrip(b'\0')
+            offset += length
+            if not isinstance(name, str):
+                name = name.decode(sys.getfilesystemencoding())
+            yield wd, mask, name
+
+    def poll(self):
+        changed = set()
+        for wd, mask, name in self.read_events():
+            if mask & self.IN_Q_OVERFLOW:
+                # Events were dropped, report everything.
+                for watched_dir in self.dirs:
+                    changed.update(self.add_watches(watched_dir))
+                continue
+            if mask & self.IN_IGNORED:
+                self.watches.pop(wd, None)
+                continue
+            root = self.watches.get(wd)
+            if root is None:
+                continue
+            path = os.path.join(root, name) if name else root
+            if mask & self.IN_ISDIR and mask & (self.IN_CREATE | self.IN_MOVED_TO):
+                changed.update(self.add_watches(path))
+            changed.add(path)
+        return changed
+
+    def run(self):
+        try:
+            while not self._stopped.is_set():
+                readable = select.select([self.fd], [], [], self.interval)[0]
+                if not readable or self._stopped.is_set():
+                    continue
+                time.sleep(self.delay)
+                changed = self.poll()
+                if changed:
+                    self.notify(changed)
+        finally:
+            self.close()
+
+    def stop(self):
+        Watcher.stop(self)
+        if not self.is_alive():
+            self.close()
+
+    def close(self):
+        if self.fd is not None:
+            os.close(self.fd)
+            self.fd = None
+
+
+def create_watcher(dirs, callback, interval=1.0):
+    """
+    Returns an InotifyWatcher for dirs where inotify is available,
+    otherwise a Watcher polling them every interval seconds.
+
+    """
+    try:
+        return InotifyWatcher(dirs, callback, interval)
+    except OSError:
+        return Watcher(dirs, callback, interval)
@@ -0,0 +1,60 @@
+import json
+import os
+from Queue import Queue
+from StringIO import StringIO
+from unittest import TestCase
+
+from mock import Mock
+
+from fugleman.accesslog import AccessLog, has_access_log
+
+
+class AccessLogTestCase(TestCase):
+
+    def setUp(self):
+        self.stream = StringIO()
+        self.log = AccessLog(stream=self.stream, flush_interval=0.01)
+
+    def records(self):
+        self.log.close()
+        return [json.loads(line) for line in self.stream.getvalue().splitlines()]
+
+    def test_it_writes_json_lines(self):
+        self.log.log({'path': '/', 'status': 200})
+        self.log.log({'path': '/about/', 'status': 404})
+        self.assertEqual(self.records(), [{'path': '/', 'status': 200},
+                                          {'path': '/about/', 'status': 404}])
+
+    def test_it_samples_paths(self):
+        self.log = AccessLog(stream=self.stream, sample={'/static/': 0.0, '/static/css/': 1.0})
+        self.log.log({'path': '/static/app.js', 'status': 200})
+        self.log.log({'path': '/static/app.js', 'status': 500})
+        self.log.log({'path': '/static/css/site.css', 'status': 200})
+        self.assertEqual(self.records(), [
+            {'path': '/static/app.js', 'status': 500},
+            {'path': '/static/css/site.css', 'status': 200},
+        ])
+
+    def test_it_drops_records_when_the_queue_is_full(self):
+        self.log.queue = Queue(1)
+        self.log._pid = os.getpid()
+        self.log.log({'path': '/'})
+        self.log.log({'path': '/about/'})
+        self.assertEqual(self.log.dropped, 1)
+        self.log.write(self.stream, [])
+        self.assertEqual(json.loads(self.stream.getvalue())['dropped'], 1)
+        self.log._pid = None
+
+    def test_it_starts_a_thread_in_each_process(self):
+        # As if the log was started in the parent of a forked worker.
+        queue = self.log.queue = Queue()
+        self.log._pid = -1
+        self.log.log({'path': '/'})
+        self.assertIsNot(self.log.queue, queue)
+        self.assertEqual(self.records(), [{'path': '/'}])
+
+    def test_it_finds_access_logs_of_sites(self):
+        application = Mock(access_log=None)
+        self.assertFalse(has_access_log(Mock(applications=[application])))
+        application.access_log = self.log
+        self.assertTrue(has_access_log(Mock(applications=[application])))
@@ -0,0 +1,454 @@
+import gzip
+import os
+import shutil
+import tempfile
+import time
+import warnings
+from io import BytesIO
+from unittest import TestCase
+
+from mock import Mock
+from werkzeug.http import http_date
+from werkzeug.test import Client, create_environ
+from werkzeug.wrappers import BaseResponse, Response
+
+from fugleman.application import Application
+from fugleman.cache import PageCache
+from fugleman.data import DataStore
+from fugleman.static import StaticFiles
+from fugleman.stats import Stats
+
+
+TEMPLATE_DIR = tempfile.mkdtemp()
+
+_application = None
+
+
+def get_application():
+    # Django settings can only be configured once per process so every
+    # test case shares one application.
+    global _application
+    if _application is None:
+        _application = Application(watch=False, TEMPLATE_DIRS=[TEMPLATE_DIR])
+    return _application
+
+
+class ApplicationTestCase(TestCase):
+
+    def setUp(self):
+        self.write('base.html', '<h1>{% block title %}{% endblock %}</h1>')
+        self.write('index.html', '{% extends "base.html" %}{% block title %}Home{% endblock %}')
+        self.write(os.path.join('about', 'index.html'), 'About')
+        self.application = get_application()
+        self.application.routes.refresh()
+        self.application.cache = PageCache()
+        self.application.server_timing = False
+        self.application.stats_url = None
+        self.application.stats = Stats()
+        self.application.stream = False
+        self.application.data = None
+        self.application.minify = False
+        self.application.access_log = None
+        self.application.static = None
+        self.application.engine.static = None
+        self.application.stream_cache_limit = 1024 * 1024
+        self.client = Client(self.application, BaseResponse)
+
+    def tearDown(self):
+        for name in os.listdir(TEMPLATE_DIR):
+            filename = os.path.join(TEMPLATE_DIR, name)
+            if os.path.isdir(filename):
+                shutil.rmtree(filename)
+            else:
+                os.remove(filename)
+
+    def write(self, name, source):
+        filename = os.path.join(TEMPLATE_DIR, name)
+        if not os.path.isdir(os.path.dirname(filename)):
+            os.makedirs(os.path.dirname(filename))
+        with open(filename, 'w') as f:
+            f.write(source)
+        return filename
+
+    def test_it_renders_templates(self):
+        response = self.client.get('/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data, b'<h1>Home</h1>')
+
+    def test_it_renders_index_templates(self):
+        self.assertEqual(self.client.get('/about/').data, b'About')
+
+    def test_it_redirects_to_a_trailing_slash(self):
+        response = self.client.get('/about')
+        self.assertEqual(response.status_code, 302)
+        self.assertTrue(response.headers['Location'].endswith('/about/'))
+
+    def test_it_returns_not_found_for_unknown_paths(self):
+        self.assertEqual(self.client.get('/missing/').status_code, 404)
+        self.assertEqual(self.client.get('/missing').status_code, 404)
+
+    def test_it_serves_cached_pages(self):
+        self.client.get('/')
+        self.client.get('/')
+        self.assertEqual(self.application.cache.hits, 1)
+
+    def test_it_rerenders_pages_when_a_dependency_changes(self):
+        self.client.get('/')
+        filename = self.write('base.html', '<h2>{% block title %}{% endblock %}</h2>')
+        mtime = os.path.getmtime(filename)
+        os.utime(filename, (mtime + 10, mtime + 10))
+        self.assertEqual(self.client.get('/').data, b'<h2>Home</h2>')
+
+    def test_it_serves_new_templates_once_the_routes_are_refreshed(self):
+        self.write('new.html', 'New')
+        self.assertEqual(self.client.get('/new/').status_code, 404)
+        self.application.templates_changed(set())
+        self.assertEqual(self.client.get('/new/').data, b'New')
+
+    def test_it_serves_pages_as_html(self):
+        self.assertEqual(self.client.get('/').headers['Content-Type'], 'text/html; charset=utf-8')
+
+    def test_it_renders_the_not_found_template(self):
+        self.write('404.html', 'Nothing to see')
+        self.application.routes.refresh()
+        response = self.client.get('/missing/')
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(response.data, b'Nothing to see')
+
+    def test_it_caches_the_not_found_page(self):
+        self.write('404.html', 'Nothing to see')
+        self.application.routes.refresh()
+        self.client.get('/missing/')
+        self.client.get('/also-missing/')
+        self.assertEqual(self.application.cache.hits, 1)
+
+    def test_it_returns_not_found_when_a_template_was_removed(self):
+        os.remove(os.path.join(TEMPLATE_DIR, 'about', 'index.html'))
+        self.assertEqual(self.client.get('/about/').status_code, 404)
+        self.assertNotIn('/about/', self.application.routes)
+
+    def test_it_finds_templates_added_since_the_index_was_built(self):
+        self.application.routes.checked = 0
+        self.assertEqual(self.client.get('/new/').status_code, 404)
+        self.write('new.html', 'New')
+        # The index was just rebuilt by the miss.
+        self.assertEqual(self.client.get('/new/').status_code, 404)
+        self.application.routes.checked = 0
+        self.assertEqual(self.client.get('/new/').data, b'New')
+
+    def test_it_sets_an_etag_and_last_modified(self):
+        response = self.client.get('/')
+        self.assertTrue(response.headers['ETag'])
+        self.assertTrue(response.headers['Last-Modified'])
+
+    def test_it_returns_not_modified_for_a_matching_etag(self):
+        etag = self.client.get('/').headers['ETag']
+        response = self.client.get('/', headers=[('If-None-Match', etag)])
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.data, b'')
+
+    def test_it_returns_the_page_for_a_stale_etag(self):
+        response = self.client.get('/', headers=[('If-None-Match', '"stale"')])
+        self.assertEqual(response.status_code, 200)
+
+    def test_it_returns_not_modified_without_rendering(self):
+        last_modified = self.client.get('/').headers['Last-Modified']
+        self.application.cache.clear()
+        response = self.client.get('/', headers=[('If-Modified-Since', last_modified)])
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(len(self.application.cache), 0)
+
+    def test_it_compresses_large_pages(self):
+        self.write('large.html', 'Hello ' * 1000)
+        self.application.routes.refresh()
+        response = self.client.get('/large/', headers=[('Accept-Encoding', 'gzip')])
+        self.assertEqual(response.headers['Content-Encoding'], 'gzip')
+        self.assertEqual(response.headers['Vary'], 'Accept-Encoding')
+        self.assertEqual(gzip.GzipFile(fileobj=BytesIO(response.data)).read(), b'Hello ' * 1000)
+
+    def test_it_caches_compressed_pages(self):
+        self.write('large.html', 'Hello ' * 1000)
+        self.application.routes.refresh()
+        self.client.get('/large/', headers=[('Accept-Encoding', 'gzip')])
+        page = self.application.cache.get('/large/')
+        self.assertIn('gzip', page.encoded)
+
+    def test_it_does_not_compress_small_pages(self):
+        response = self.client.get('/', headers=[('Accept-Encoding', 'gzip')])
+        self.assertNotIn('Content-Encoding', response.headers)
+
+    def test_it_does_not_compress_for_clients_that_cant_decompress(self):
+        self.write('large.html', 'Hello ' * 1000)
+        self.application.routes.refresh()
+        response = self.client.get('/large/')
+        self.assertNotIn('Content-Encoding', response.headers)
+
+    def test_it_adds_a_server_timing_header(self):
+        self.application.server_timing = True
+        header = self.client.get('/').headers['Server-Timing']
+        for phase in ('parse', 'resolve', 'load', 'render', 'encode'):
+            self.assertIn('%s;dur=' % phase, header)
+
+    def test_it_does_not_time_requests_by_default(self):
+        self.assertNotIn('Server-Timing', self.client.get('/').headers)
+
+    def test_it_serves_aggregated_timings(self):
+        self.application.stats_url = '/_fugleman/stats'
+        self.client.get('/')
+        self.client.get('/')
+        response = self.client.get('/_fugleman/stats')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(b'fugleman_request_phase_seconds_count{phase="total"} 2\n', response.data)
+        self.assertIn(b'fugleman_page_cache_hits 1\n', response.data)
+
+    def test_it_streams_pages(self):
+        self.application.stream = True
+        self.write('list.html', '{% extends "base.html" %}{% block title %}'
+                                '{% for i in "abc" %}{{ i }}{% endfor %}{% endblock %}')
+        self.application.routes.refresh()
+        response = self.client.get('/list/')
+        self.assertEqual(response.data, b'<h1>abc</h1>')
+        self.assertNotIn('Content-Length', response.headers)
+        self.assertIsNotNone(response.headers.get('Last-Modified'))
+
+    def test_it_caches_streamed_pages(self):
+        self.application.stream = True
+        self.assertEqual(self.client.get('/').data, b'<h1>Home</h1>')
+        self.assertEqual(self.application.cache.get('/').content, b'<h1>Home</h1>')
+
+    def test_it_does_not_cache_streamed_pages_over_the_limit(self):
+        self.application.stream = True
+        self.application.stream_cache_limit = 5
+        self.assertEqual(self.client.get('/').data, b'<h1>Home</h1>')
+        self.assertEqual(len(self.application.cache), 0)
+
+    def test_it_compresses_streamed_pages(self):
+        self.application.stream = True
+        response = self.client.get('/', headers=[('Accept-Encoding', 'gzip')])
+        self.assertEqual(response.headers['Content-Encoding'], 'gzip')
+        self.assertEqual(gzip.GzipFile(fileobj=BytesIO(response.data)).read(), b'<h1>Home</h1>')
+
+    def test_it_invalidates_pages_built_from_changed_templates(self):
+        self.application.cache = PageCache(check_stale=False)
+        self.client.get('/')
+        self.client.get('/about/')
+        filename = self.write('base.html', '<h2>{% block title %}{% endblock %}</h2>')
+        self.application.templates_changed(set([filename]))
+        self.assertIsNone(self.application.cache.get('/'))
+        self.assertIsNotNone(self.application.cache.get('/about/'))
+        self.assertEqual(self.client.get('/').data, b'<h2>Home</h2>')
+
+    def test_it_recompiles_pages_including_changed_templates(self):
+        self.write('p.html', 'P[{% include "nav.html" %}]')
+        self.write('nav.html', 'nav1')
+        self.application.routes.refresh()
+        self.application.cache = PageCache(check_stale=False)
+        self.assertEqual(self.client.get('/p/').data, b'P[nav1]')
+        # The page isn't cached, its compiled template still is.
+        self.application.cache.clear()
+        filename = self.write('nav.html', 'nav2')
+        self.application.templates_changed(set([filename]))
+        self.assertEqual(self.client.get('/p/').data, b'P[nav2]')
+
+    def test_it_invalidates_pages_a_new_template_shadows(self):
+        self.application.cache = PageCache(check_stale=False)
+        self.client.get('/about/')
+        filename = self.write('about.html', 'Shadowed')
+        self.application.templates_changed(set([filename]))
+        self.assertEqual(self.client.get('/about/').data, b'Shadowed')
+
+    def test_it_warms_up_every_template(self):
+        count, duration = self.application.warmup()
+        self.assertEqual(count, 3)
+        self.assertIn('base.html', self.application.engine.template_cache)
+
+    def test_it_does_not_let_template_loaders_be_set(self):
+        self.assertRaises(ValueError, Application, watch=False,
+                          TEMPLATE_LOADERS=('django.template.loaders.filesystem.Loader',))
+
+    def test_it_warns_that_settings_are_already_configured(self):
+        with warnings.catch_warnings(record=True) as caught:
+            warnings.simplefilter('always')
+            Application(template_dirs=[TEMPLATE_DIR], watch=False, DEBUG=True)
+        self.assertEqual(len(caught), 1)
+        self.assertIn('DEBUG', str(caught[0].message))
+
+    def test_it_serves_applications_with_their_own_templates(self):
+        template_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, template_dir)
+        with open(os.path.join(template_dir, 'base.html'), 'w') as f:
+            f.write('<h3>{% block title %}{% endblock %}</h3>')
+        with open(os.path.join(template_dir, 'index.html'), 'w') as f:
+            f.write('{% extends "base.html" %}{% block title %}Other{% endblock %}')
+        other = Application(template_dirs=[template_dir], watch=False)
+        self.assertEqual(Client(other, BaseResponse).get('/').data, b'<h3>Other</h3>')
+        self.assertEqual(self.client.get('/').data, b'<h1>Home</h1>')
+
+    def test_it_redirects_within_its_script_root(self):
+        response = self.client.get('/about', environ_overrides={'SCRIPT_NAME': '/site'})
+        self.assertTrue(response.headers['Location'].endswith('/site/about/'))
+
+    def test_it_renders_pages_with_their_data(self):
+        data_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, data_dir)
+        with open(os.path.join(data_dir, 'about.json'), 'w') as f:
+            f.write('{"name": "Fugleman"}')
+        self.write(os.path.join('about', 'index.html'), 'About {{ name }}')
+        self.application.data = DataStore(data_dir)
+        self.assertEqual(self.client.get('/about/').data, b'About Fugleman')
+        self.assertIn(os.path.join(data_dir, 'about.json'), self.application.dependencies('/about/'))
+
+    def test_it_invalidates_pages_when_their_data_changes(self):
+        data_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, data_dir)
+        self.application.cache = PageCache(check_stale=False)
+        self.application.data = DataStore(data_dir)
+        self.client.get('/about/')
+        self.client.get('/')
+        filename = os.path.join(data_dir, 'about.json')
+        with open(filename, 'w') as f:
+            f.write('{}')
+        self.application.templates_changed(set([filename]))
+        self.assertIsNone(self.application.cache.get('/about/'))
+        self.assertIsNotNone(self.application.cache.get('/'))
+
+    def test_it_clears_cached_fragments_when_their_template_changes(self):
+        self.write('base.html', '{% load fugleman %}{% fugcache title 0 %}'
+                                '<h1>{% block title %}{% endblock %}</h1>{% endfugcache %}')
+        self.write('about.html', '{% extends "base.html" %}{% block title %}About{% endblock %}')
+        self.application.routes.refresh()
+        self.assertEqual(self.client.get('/').data, b'<h1>Home</h1>')
+        self.assertEqual(self.client.get('/about/').data, b'<h1>Home</h1>')
+        filename = self.write('base.html', '{% load fugleman %}{% fugcache title 0 %}'
+                                           '<h2>{% block title %}{% endblock %}</h2>{% endfugcache %}')
+        mtime = os.path.getmtime(filename)
+        os.utime(filename, (mtime + 10, mtime + 10))
+        self.assertEqual(self.client.get('/about/').data, b'<h2>About</h2>')
+
+    def test_it_minifies_pages(self):
+        self.application.minify = True
+        self.write('spaced.html', '<p>\n   Spaced  <!-- out --></p>')
+        self.application.routes.refresh()
+        self.assertEqual(self.client.get('/spaced/').data, b'<p>\nSpaced </p>')
+
+    def test_it_links_to_fingerprinted_assets(self):
+        static_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, static_dir)
+        filename = os.path.join(static_dir, 'site.css')
+        with open(filename, 'w') as f:
+            f.write('body { color: red; }')
+        self.application.static = self.application.engine.static = StaticFiles(static_dir, fingerprint=True)
+        self.application.cache = PageCache(check_stale=False)
+        self.write('linked.html', '{% load fugleman %}{% asset "site.css" %}')
+        self.application.routes.refresh()
+        url = self.client.get('/linked/').data.decode('utf-8')
+        self.assertRegexpMatches(url, r'^/static/site\.[0-9a-f]{12}\.css$')
+        self.assertEqual(self.client.get(url).data, b'body { color: red; }')
+        with open(filename, 'w') as f:
+            f.write('body { color: blue; }')
+        self.application.templates_changed(set([filename]))
+        self.assertNotEqual(self.client.get('/linked/').data.decode('utf-8'), url)
+
+    def use_fingerprinted_assets(self):
+        static_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, static_dir)
+        filename = os.path.join(static_dir, 'site.css')
+        with open(filename, 'w') as f:
+            f.write('body { color: red; }')
+        self.application.static = self.application.engine.static = StaticFiles(static_dir, fingerprint=True)
+        self.write('linked.html', '{% load fugleman %}{% asset "site.css" %}')
+        self.application.routes.refresh()
+        return filename
+
+    def test_it_revalidates_pages_when_their_assets_change(self):
+        filename = self.use_fingerprinted_assets()
+        self.application.cache = PageCache(check_stale=False)
+        # Make the page and its assets older than the client's copy.
+        before = time.time() - 10
+        os.utime(os.path.join(TEMPLATE_DIR, 'linked.html'), (before, before))
+        self.application.static.manifest.modified = before
+        headers = [('If-Modified-Since', http_date(time.time() - 5))]
+        self.assertEqual(self.client.get('/linked/', headers=headers).status_code, 304)
+        with open(filename, 'w') as f:
+            f.write('body { color: blue; }')
+        self.application.templates_changed(set([filename]))
+        response = self.client.get('/linked/', headers=headers)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data.decode('utf-8'), self.application.static.asset_url('site.css'))
+
+    def test_it_polls_assets_when_not_watching(self):
+        filename = self.use_fingerprinted_assets()
+        self.application.cache = PageCache(check_stale=False)
+        url = self.client.get('/linked/').data
+        with open(filename, 'w') as f:
+            f.write('body { color: blue; }')
+        self.client.get(url)
+        self.application.static.manifest.checked = 0
+        self.assertNotEqual(self.client.get('/linked/').data, url)
+
+    def test_it_links_to_assets_under_the_script_root(self):
+        self.use_fingerprinted_assets()
+        url = self.client.get('/linked/', base_url='http://localhost/blog/').data.decode('utf-8')
+        self.assertRegexpMatches(url, r'^/blog/static/site\.[0-9a-f]{12}\.css$')
+
+    def test_it_logs_requests(self):
+        self.application.access_log = Mock()
+        self.client.get('/')
+        self.client.get('/')
+        response = self.client.get('/missing/')
+        self.assertTrue(response.data)
+        response.close()
+        records = [args[0] for args, kwargs in self.application.access_log.log.call_args_list]
+        self.assertEqual([(r['path'], r['status'], r['bytes'], r['cache']) for r in records], [
+            ('/', 200, 13, 'miss'),
+            ('/', 200, 13, 'hit'),
+            ('/missing/', 404, records[2]['bytes'], None),
+        ])
+        self.assertGreater(records[2]['bytes'], 0)
+        self.assertGreater(records[0]['render'], 0)
+
+    def test_it_logs_streamed_responses_once_they_are_sent(self):
+        self.application.access_log = Mock()
+        self.application.stream = True
+        response = self.client.get('/')
+        self.assertEqual(response.data, b'<h1>Home</h1>')
+        self.assertFalse(self.application.access_log.log.called)
+        response.close()
+        record = self.application.access_log.log.call_args[0][0]
+        self.assertEqual(record['bytes'], 13)
+
+    def test_it_times_streamed_pages_once_they_are_sent(self):
+        self.application.access_log = Mock()
+        self.application.stats_url = '/_stats/'
+        self.application.stream = True
+        self.write('slow.html', '{% for i in "abcdefghij" %}{{ i }}{% endfor %}')
+        self.application.routes.refresh()
+        response = self.client.get('/slow/')
+        self.assertEqual(self.application.stats.histograms['render'].count, 0)
+        self.assertEqual(response.data, b'abcdefghij')
+        response.close()
+        record = self.application.access_log.log.call_args[0][0]
+        self.assertGreater(record['render'], 0)
+        self.assertGreaterEqual(record['duration'], record['render'])
+        self.assertEqual(self.application.stats.histograms['render'].count, 1)
+
+    def test_it_logs_head_requests(self):
+        self.application.access_log = Mock()
+        self.application.stream = True
+        self.client.head('/')
+        record = self.application.access_log.log.call_args[0][0]
+        self.assertEqual((record['method'], record['status'], record['bytes']), ('HEAD', 200, 0))
+
+    def test_it_logs_responses_from_finish_response(self):
+        self.application.access_log = Mock()
+        request = self.application.make_request(create_environ('/'))
+        body = Mock()
+        body.__iter__ = Mock(return_value=iter([b'ab', b'c']))
+        response = Response(body, direct_passthrough=True)
+        self.application.finish_response(request, response)
+        self.assertFalse(self.application.access_log.log.called)
+        self.assertEqual(b''.join(response.response), b'abc')
+        response.response.close()
+        self.assertTrue(body.close.called)
+        record = self.application.access_log.log.call_args[0][0]
+        self.assertEqual((record['path'], record['bytes']), ('/', 3))
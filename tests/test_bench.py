@@ -0,0 +1,46 @@
+from unittest import TestCase
+
+from werkzeug.wrappers import Request, Response
+from werkzeug.utils import redirect
+
+from fugleman.bench import Benchmark, crawl, outcome, percentile
+
+
+@Request.application
+def application(request):
+    if request.path == '/':
+        return Response('<a href="/about/">About</a> <a href="/missing/#top">Missing</a>')
+    if request.path == '/about/':
+        return Response('<a href="/">Home</a>')
+    if request.path == '/about':
+        return redirect('/about/')
+    return Response('Not found', status=404)
+
+
+class BenchTestCase(TestCase):
+
+    def test_it_classifies_outcomes(self):
+        self.assertEqual(outcome(200), 'render')
+        self.assertEqual(outcome(304), 'render')
+        self.assertEqual(outcome(302), 'redirect')
+        self.assertEqual(outcome(404), 'not_found')
+        self.assertEqual(outcome(500), 'error')
+
+    def test_it_calculates_nearest_rank_percentiles(self):
+        latencies = list(range(1, 101))
+        self.assertEqual(percentile(latencies, 50), 50)
+        self.assertEqual(percentile(latencies, 99), 99)
+        self.assertEqual(percentile([7], 95), 7)
+        self.assertIsNone(percentile([], 50))
+
+    def test_it_crawls_links(self):
+        self.assertEqual(crawl(application), ['/', '/about/', '/missing/'])
+
+    def test_it_times_requests_by_outcome(self):
+        result = Benchmark(application, ['/', '/about', '/missing/'], concurrency=2, duration=0.05).run()
+        self.assertTrue(result.latencies['render'])
+        self.assertTrue(result.latencies['redirect'])
+        self.assertTrue(result.latencies['not_found'])
+        self.assertEqual(result.latencies['error'], [])
+        self.assertEqual(result.concurrency, 2)
+        self.assertTrue(result.requests_per_second > 0)
@@ -0,0 +1,122 @@
+import gzip
+import json
+import os
+import shutil
+import tempfile
+from unittest import TestCase
+
+from mock import Mock
+
+from fugleman.build import Builder
+from fugleman.static import StaticFiles
+
+
+class BuilderTestCase(TestCase):
+
+    def setUp(self):
+        self.template_dir = tempfile.mkdtemp()
+        self.output_dir = tempfile.mkdtemp()
+        for name in ('index.html', 'about.html', 'broken.html'):
+            with open(os.path.join(self.template_dir, name), 'w') as f:
+                f.write('')
+        self.application = Mock()
+        self.application.template_dirs = [self.template_dir]
+        self.application.render = Mock(side_effect=self.render)
+        self.application.dependencies = Mock(side_effect=self.dependencies)
+        self.application.static = None
+        self.builder = Builder(self.application, self.output_dir, jobs=1)
+
+    def tearDown(self):
+        shutil.rmtree(self.template_dir)
+        shutil.rmtree(self.output_dir)
+
+    def render(self, path):
+        if path == '/broken/':
+            raise ValueError('broken')
+        return u'Page %s' % path
+
+    def dependencies(self, path):
+        name = '%s.html' % (path.strip('/') or 'index')
+        return {os.path.join(self.template_dir, name): 0}
+
+    def touch(self, name, source='changed'):
+        with open(os.path.join(self.template_dir, name), 'w') as f:
+            f.write(source)
+
+    def read(self, *paths):
+        with open(os.path.join(self.output_dir, *paths)) as f:
+            return f.read()
+
+    def test_it_writes_every_page_to_an_index_file(self):
+        result = self.builder.build()
+        self.assertEqual(result.rendered, 2)
+        self.assertEqual(self.read('index.html'), 'Page /')
+        self.assertEqual(self.read('about', 'index.html'), 'Page /about/')
+
+    def test_it_collects_render_errors(self):
+        result = self.builder.build()
+        self.assertEqual(result.errors, {'/broken/': 'ValueError: broken'})
+
+    def test_it_only_renders_pages_whose_templates_changed(self):
+        self.builder.build()
+        self.touch('about.html')
+        self.application.render.reset_mock()
+        result = self.builder.build()
+        self.assertEqual(result.rendered, 1)
+        self.assertEqual(result.skipped, 1)
+        paths = sorted(call[0][0] for call in self.application.render.call_args_list)
+        self.assertEqual(paths, ['/about/', '/broken/'])
+
+    def test_it_renders_everything_when_forced(self):
+        self.builder.build()
+        result = self.builder.build(force=True)
+        self.assertEqual(result.rendered, 2)
+        self.assertEqual(result.skipped, 0)
+
+    def test_it_removes_pages_whose_templates_were_deleted(self):
+        self.builder.build()
+        os.remove(os.path.join(self.template_dir, 'about.html'))
+        result = self.builder.build()
+        self.assertEqual(result.removed, 1)
+        self.assertFalse(os.path.exists(os.path.join(self.output_dir, 'about', 'index.html')))
+
+    def test_it_minifies_pages(self):
+        self.application.render = Mock(return_value=u'<p>\n  Page  </p>')
+        Builder(self.application, self.output_dir, jobs=1, minify=True).build()
+        self.assertEqual(self.read('index.html'), '<p>\nPage </p>')
+
+    def test_it_writes_precompressed_pages(self):
+        Builder(self.application, self.output_dir, jobs=1, precompress=True).build()
+        with open(os.path.join(self.output_dir, 'index.html.gz'), 'rb') as f:
+            self.assertEqual(gzip.GzipFile(fileobj=f).read(), b'Page /')
+
+    def test_it_removes_precompressed_pages_when_no_longer_asked_to(self):
+        Builder(self.application, self.output_dir, jobs=1, precompress=True).build()
+        result = self.builder.build()
+        self.assertEqual(result.rendered, 2)
+        self.assertFalse(os.path.exists(os.path.join(self.output_dir, 'index.html.gz')))
+
+    def test_it_copies_fingerprinted_static_files(self):
+        static_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, static_dir)
+        with open(os.path.join(static_dir, 'site.css'), 'w') as f:
+            f.write('body { color: red; }')
+        self.application.static = StaticFiles(static_dir, fingerprint=True)
+        self.builder.build()
+        hashed = self.application.static.manifest.names['site.css']
+        self.assertEqual(self.read('static', 'site.css'), 'body { color: red; }')
+        self.assertEqual(self.read('static', hashed), 'body { color: red; }')
+        self.assertEqual(json.loads(self.read('static', 'assets.json')), {'site.css': hashed})
+
+    def test_it_renders_everything_when_a_static_file_changes(self):
+        static_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, static_dir)
+        filename = os.path.join(static_dir, 'site.css')
+        with open(filename, 'w') as f:
+            f.write('body { color: red; }')
+        self.application.static = StaticFiles(static_dir, fingerprint=True)
+        self.builder.build()
+        with open(filename, 'w') as f:
+            f.write('body { color: blue; }')
+        self.application.static.manifest.update([filename])
+        self.assertEqual(self.builder.build().rendered, 2)
@@ -0,0 +1,206 @@
+import os
+import shutil
+import tempfile
+from unittest import TestCase
+
+from fugleman.cache import FragmentCache, Page, PageCache, SharedPageCache
+
+
+class PageCacheTestCase(TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.filename = os.path.join(self.tmpdir, 'index.html')
+        with open(self.filename, 'w') as f:
+            f.write('Hello')
+        self.cache = PageCache(max_size=2)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def make_page(self):
+        return Page(b'Hello', {self.filename: os.path.getmtime(self.filename)})
+
+    def test_it_returns_cached_pages(self):
+        page = self.make_page()
+        self.cache.set('/', page)
+        self.assertIs(self.cache.get('/'), page)
+        self.assertEqual(self.cache.hits, 1)
+
+    def test_it_counts_misses(self):
+        self.assertIsNone(self.cache.get('/'))
+        self.assertEqual(self.cache.misses, 1)
+
+    def test_it_evicts_the_least_recently_used_page(self):
+        self.cache.set('/a/', self.make_page())
+        self.cache.set('/b/', self.make_page())
+        self.cache.get('/a/')
+        self.cache.set('/c/', self.make_page())
+        self.assertIsNone(self.cache.get('/b/'))
+        self.assertIsNotNone(self.cache.get('/a/'))
+        self.assertEqual(self.cache.evictions, 1)
+
+    def test_it_drops_pages_when_a_template_changes(self):
+        self.cache.set('/', self.make_page())
+        mtime = os.path.getmtime(self.filename)
+        os.utime(self.filename, (mtime + 10, mtime + 10))
+        self.assertIsNone(self.cache.get('/'))
+        self.assertEqual(self.cache.invalidations, 1)
+        self.assertEqual(len(self.cache), 0)
+
+    def test_it_drops_pages_when_a_template_is_removed(self):
+        self.cache.set('/', self.make_page())
+        os.remove(self.filename)
+        self.assertIsNone(self.cache.get('/'))
+
+    def test_it_stores_nothing_when_disabled(self):
+        cache = PageCache(max_size=0)
+        cache.set('/', self.make_page())
+        self.assertEqual(len(cache), 0)
+
+    def test_it_trusts_pages_when_not_checking_staleness(self):
+        cache = PageCache(check_stale=False)
+        page = self.make_page()
+        cache.set('/', page)
+        os.remove(self.filename)
+        self.assertIs(cache.get('/'), page)
+
+    def test_it_invalidates_matching_pages(self):
+        page = self.make_page()
+        self.cache.set('/a/', page)
+        self.cache.set('/b/', self.make_page())
+        self.assertEqual(self.cache.invalidate(lambda key, page: key == '/a/'), [page])
+        self.assertIsNone(self.cache.get('/a/'))
+        self.assertIsNotNone(self.cache.get('/b/'))
+        self.assertEqual(self.cache.invalidations, 1)
+
+    def test_it_does_not_put_back_pages_invalidated_while_checking_them(self):
+        page = self.make_page()
+        self.cache.set('/', page)
+
+        def is_stale():
+            # Another thread invalidates the page while it's checked.
+            self.cache.invalidate(lambda key, page: True)
+            return False
+
+        page.is_stale = is_stale
+        self.assertIs(self.cache.get('/'), page)
+        self.assertEqual(len(self.cache), 0)
+
+
+class SharedPageCacheTestCase(TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.filename = os.path.join(self.tmpdir, 'index.html')
+        with open(self.filename, 'w') as f:
+            f.write('Hello')
+        self.cache_file = os.path.join(self.tmpdir, 'pages.cache')
+        self.cache = self.open_cache()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def open_cache(self, **kwargs):
+        kwargs.setdefault('max_size', 16)
+        kwargs.setdefault('data_size', 4096)
+        return SharedPageCache(self.cache_file, **kwargs)
+
+    def make_page(self, content=b'Hello'):
+        return Page(content, {self.filename: os.path.getmtime(self.filename)})
+
+    def test_it_returns_cached_pages(self):
+        page = self.make_page()
+        self.cache.set('/', page)
+        cached = self.cache.get('/')
+        self.assertEqual((cached.content, cached.etag, cached.dependencies),
+                         (page.content, page.etag, page.dependencies))
+        self.assertIsNone(self.cache.get('/about/'))
+        self.assertEqual((self.cache.hits, self.cache.misses), (1, 1))
+
+    def test_it_shares_pages_between_processes(self):
+        pid = os.fork()
+        if pid == 0:
+            try:
+                self.open_cache().set('/', self.make_page(b'From the child'))
+            finally:
+                os._exit(0)
+        os.waitpid(pid, 0)
+        self.assertEqual(self.cache.get('/').content, b'From the child')
+
+    def test_it_reuses_decoded_pages_until_they_change(self):
+        self.open_cache().set('/', self.make_page())
+        page = self.cache.get('/')
+        page.encode('gzip')
+        self.assertIs(self.cache.get('/'), page)
+        self.open_cache().set('/', self.make_page(b'Changed'))
+        self.assertEqual(self.cache.get('/').content, b'Changed')
+
+    def test_it_drops_pages_the_ring_overwrites(self):
+        for i in range(8):
+            self.cache.set('/%d/' % i, self.make_page(b'x' * 1000))
+        self.assertIsNone(self.cache.get('/0/'))
+        self.assertEqual(self.cache.get('/7/').content, b'x' * 1000)
+        self.assertLess(len(self.cache), 8)
+
+    def test_it_evicts_the_oldest_page_when_the_slots_are_full(self):
+        self.cache = self.open_cache(max_size=2)
+        for key in ('/a/', '/b/', '/c/'):
+            self.cache.set(key, self.make_page())
+        self.assertIsNone(self.cache.get('/a/'))
+        self.assertIsNotNone(self.cache.get('/c/'))
+        self.assertEqual(self.cache.evictions, 1)
+
+    def test_it_does_not_store_pages_larger_than_the_file(self):
+        self.cache.set('/', self.make_page(b'x' * 8192))
+        self.assertIsNone(self.cache.get('/'))
+
+    def test_it_drops_pages_when_a_template_changes(self):
+        self.cache.set('/', self.make_page())
+        mtime = os.path.getmtime(self.filename)
+        os.utime(self.filename, (mtime + 10, mtime + 10))
+        self.assertIsNone(self.cache.get('/'))
+        self.assertEqual(len(self.cache), 0)
+
+    def test_it_invalidates_matching_pages(self):
+        self.cache.set('/a/', self.make_page(b'a'))
+        self.cache.set('/b/', self.make_page(b'b'))
+        removed = self.cache.invalidate(lambda key, page: key == '/a/')
+        self.assertEqual([page.content for page in removed], [b'a'])
+        self.assertIsNone(self.open_cache().get('/a/'))
+        self.assertIsNotNone(self.open_cache().get('/b/'))
+
+    def test_it_replaces_a_file_with_another_layout(self):
+        self.cache.set('/', self.make_page())
+        self.assertEqual(len(self.open_cache()), 1)
+        cache = self.open_cache(max_size=32)
+        self.assertEqual(len(cache), 0)
+        # The old mapping keeps working until its process restarts.
+        self.assertIsNotNone(self.cache.get('/'))
+
+    def test_it_clears_every_page(self):
+        self.cache.set('/', self.make_page())
+        self.cache.clear()
+        self.assertEqual(self.cache.stats()['size'], 0)
+
+
+class FragmentCacheTestCase(TestCase):
+
+    def setUp(self):
+        self.cache = FragmentCache(max_size=2)
+
+    def test_it_returns_cached_fragments(self):
+        self.cache.set('nav', u'<nav>')
+        self.assertEqual(self.cache.get('nav'), u'<nav>')
+
+    def test_it_expires_fragments(self):
+        self.cache.set('nav', u'<nav>', timeout=-1)
+        self.assertIsNone(self.cache.get('nav'))
+
+    def test_it_evicts_the_least_recently_used_fragment(self):
+        self.cache.set('a', u'a')
+        self.cache.set('b', u'b')
+        self.cache.get('a')
+        self.cache.set('c', u'c')
+        self.assertIsNone(self.cache.get('b'))
+        self.assertEqual(self.cache.get('a'), u'a')
@@ -1,8 +1,9 @@
+import multiprocessing
 from unittest import TestCase
 
 from mock import Mock
 
-from fugleman.commands import CommandError, ServeCommand
+from fugleman.commands import BenchCommand, BuildCommand, CommandError, ProfileCommand, ServeCommand
 
 
 class ServeCommandTestCase(TestCase):
@@ -27,3 +28,48 @@ class ServeCommandTestCase(TestCase):
 
     def test_it_raises_error_when_port_is_not_valid(self):
         self.assertRaises(CommandError, self.command.handle, 'not-a-port-number')
+
+    def test_it_runs_the_development_server_by_default(self):
+        self.command.handle()
+        self.assertFalse(self.command.production)
+
+    def test_it_runs_the_production_server_with_a_worker_per_cpu(self):
+        self.command.handle(production=True)
+        self.assertTrue(self.command.production)
+        self.assertEqual(self.command.workers, multiprocessing.cpu_count())
+        self.assertEqual(self.command.threads, ServeCommand.DEFAULT_THREADS)
+
+    def test_workers_and_threads_imply_production(self):
+        self.command.handle(workers=2, threads=4)
+        self.assertTrue(self.command.production)
+        self.assertEqual(self.command.workers, 2)
+        self.assertEqual(self.command.threads, 4)
+
+    def test_it_warms_up_the_application_when_asked(self):
+        self.command.handle(warmup=True)
+        self.assertTrue(self.command.warmup)
+
+    def test_it_reports_the_warmup(self):
+        self.app.warmup.return_value = (3, 0.5)
+        self.command.warm_up(self.app)
+        self.command.stdout.write.assert_called_with("Compiled 3 templates in 0.50s.\n")
+
+    def test_it_raises_error_when_there_are_no_workers(self):
+        self.assertRaises(CommandError, self.command.handle, production=True, workers=0)
+
+
+class SitesCommandTestCase(TestCase):
+
+    def create_command(self, command_class):
+        command = command_class(Mock(), 'test', Mock(), Mock())
+        command.load_application = Mock(return_value=Mock(spec=['applications']))
+        return command
+
+    def test_it_does_not_build_sites(self):
+        self.assertRaises(CommandError, self.create_command(BuildCommand).handle)
+
+    def test_it_does_not_profile_sites(self):
+        self.assertRaises(CommandError, self.create_command(ProfileCommand).handle, '/')
+
+    def test_it_needs_paths_to_benchmark_sites(self):
+        self.assertRaises(CommandError, self.create_command(BenchCommand).handle)
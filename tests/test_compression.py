@@ -0,0 +1,34 @@
+import gzip
+from io import BytesIO
+from unittest import TestCase
+
+from mock import Mock
+from werkzeug.datastructures import Accept
+
+from fugleman import compression
+
+
+class CompressionTestCase(TestCase):
+
+    def request(self, accept_encodings):
+        request = Mock()
+        request.accept_encodings = Accept([(encoding, 1) for encoding in accept_encodings])
+        return request
+
+    def test_it_gzips_data(self):
+        data = compression.compress(b'Hello' * 100, 'gzip')
+        self.assertEqual(gzip.GzipFile(fileobj=BytesIO(data)).read(), b'Hello' * 100)
+
+    def test_it_compresses_deterministically(self):
+        self.assertEqual(compression.compress(b'Hello', 'gzip'), compression.compress(b'Hello', 'gzip'))
+
+    def test_it_gzips_a_stream(self):
+        chunks = list(compression.compress_stream([b'Hello'] * 100, 'gzip'))
+        self.assertGreater(len(chunks), 1)
+        self.assertEqual(gzip.GzipFile(fileobj=BytesIO(b''.join(chunks))).read(), b'Hello' * 100)
+
+    def test_it_negotiates_an_accepted_encoding(self):
+        self.assertEqual(compression.negotiate(self.request(['gzip', 'deflate'])), 'gzip')
+
+    def test_it_negotiates_nothing_when_no_encoding_is_accepted(self):
+        self.assertIsNone(compression.negotiate(self.request(['deflate'])))
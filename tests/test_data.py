@@ -0,0 +1,57 @@
+import json
+import os
+import shutil
+import tempfile
+from unittest import TestCase
+
+from fugleman.data import DataStore
+
+
+class DataStoreTestCase(TestCase):
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.store = DataStore(self.root)
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+
+    def write(self, name, value):
+        filename = os.path.join(self.root, name)
+        if not os.path.isdir(os.path.dirname(filename)):
+            os.makedirs(os.path.dirname(filename))
+        with open(filename, 'w') as f:
+            json.dump(value, f)
+        return filename
+
+    def test_it_finds_page_data(self):
+        filename = self.write(os.path.join('blog', 'post.json'), {})
+        self.assertEqual(self.store.find('/blog/post/'), filename)
+
+    def test_it_finds_index_data(self):
+        filename = self.write(os.path.join('blog', 'index.json'), {})
+        self.assertEqual(self.store.find('/blog/'), filename)
+        self.assertIsNone(self.store.find('/'))
+
+    def test_it_builds_a_context_from_global_and_page_data(self):
+        self.write(os.path.join('_global', 'products.json'), ['a', 'b'])
+        self.write('about.json', {'title': 'About'})
+        self.assertEqual(self.store.context('/about/'), {'products': ['a', 'b'], 'title': 'About'})
+        self.assertEqual(self.store.context(), {'products': ['a', 'b']})
+
+    def test_it_memoizes_parsed_data(self):
+        filename = self.write('about.json', {'title': 'About'})
+        self.assertIs(self.store.load(filename), self.store.load(filename))
+
+    def test_it_reloads_changed_data(self):
+        filename = self.write('about.json', {'title': 'About'})
+        self.store.load(filename)
+        self.write('about.json', {'title': 'Changed'})
+        mtime = os.path.getmtime(filename)
+        os.utime(filename, (mtime + 10, mtime + 10))
+        self.assertEqual(self.store.load(filename), {'title': 'Changed'})
+
+    def test_it_maps_data_files_to_paths(self):
+        self.assertEqual(self.store.page_path(os.path.join(self.root, 'blog', 'post.yaml')), '/blog/post/')
+        self.assertEqual(self.store.page_path(os.path.join(self.root, 'index.json')), '/')
+        self.assertIsNone(self.store.page_path(os.path.join(self.root, '_global', 'a.json')))
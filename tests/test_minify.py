@@ -0,0 +1,24 @@
+from unittest import TestCase
+
+from fugleman.minify import minify_html
+
+
+class MinifyTestCase(TestCase):
+
+    def test_it_collapses_whitespace(self):
+        self.assertEqual(minify_html(u'  <p>Hello   <b>World</b>\n\n  </p>  '),
+                         u'<p>Hello <b>World</b>\n</p>')
+
+    def test_it_removes_comments(self):
+        self.assertEqual(minify_html(u'<p><!-- note -->Hello</p>'), u'<p>Hello</p>')
+
+    def test_it_keeps_conditional_comments(self):
+        html = u'<!--[if IE]><p>IE</p><![endif]-->'
+        self.assertEqual(minify_html(html), html)
+
+    def test_it_leaves_preformatted_elements_alone(self):
+        for html in (u'<pre>  a\n   b  </pre>',
+                     u'<textarea>  a  </textarea>',
+                     u'<script>var a  =  "<!-- b -->";</script>',
+                     u'<STYLE>p  {  }</STYLE>'):
+            self.assertEqual(minify_html(u'<div>  %s  </div>' % html), u'<div> %s </div>' % html)
@@ -0,0 +1,59 @@
+import os
+import shutil
+import tempfile
+from unittest import TestCase
+
+from django.template import Library
+from django.template.base import TOKEN_BLOCK, Token
+
+from fugleman.profiler import StackProfiler, node_label
+
+
+def outer():
+    return inner() + inner()
+
+
+def inner():
+    return sum(range(100))
+
+
+class Node(object):
+    pass
+
+
+class StackProfilerTestCase(TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_it_records_time_per_stack(self):
+        profiler = StackProfiler()
+        profiler.runcall(outer)
+        self.assertIn('test_profiler.py:outer', profiler.stacks)
+        self.assertIn('test_profiler.py:outer;test_profiler.py:inner', profiler.stacks)
+
+    def test_it_writes_collapsed_stacks(self):
+        profiler = StackProfiler()
+        profiler.stacks = {'a;b': 0.002, 'a': 0.0000001}
+        filename = os.path.join(self.tmpdir, 'out.collapsed')
+        profiler.write_collapsed(filename)
+        with open(filename) as f:
+            self.assertEqual(f.read(), 'a;b 2000\n')
+
+    def test_it_labels_nodes_by_what_they_refer_to(self):
+        node = Node()
+        self.assertEqual(node_label(node), 'Node')
+        node.name = 'content'
+        self.assertEqual(node_label(node), 'Node(content)')
+
+    def test_it_labels_custom_tags_by_their_function(self):
+        def greeting():
+            return 'Hello'
+
+        library = Library()
+        library.simple_tag(greeting)
+        node = library.tags['greeting'](None, Token(TOKEN_BLOCK, 'greeting'))
+        self.assertEqual(node_label(node), 'SimpleNode(greeting)')
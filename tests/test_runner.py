@@ -1,9 +1,12 @@
+import os
+import subprocess
+import sys
 from unittest import TestCase
 from StringIO import StringIO
 
-from mock import Mock
+from mock import Mock, patch
 
-from fugleman import __version__
+from fugleman import __version__, commands
 from fugleman.runner import CommandRunner
 
 
@@ -69,3 +72,37 @@ class CommandRunnerWithSubcommandTestCase(BaseCommandRunnerTestCase):
     def test_it_prints_help_for_the_subcommand(self):
         self.call_command('PROGNAME', 'help', 'dostuff')
         self.subcommand.print_help.assert_called_with()
+
+
+class CommandRunnerSubcommandLoadingTestCase(BaseCommandRunnerTestCase):
+
+    def test_it_imports_subcommands_from_dotted_paths(self):
+        runner = CommandRunner(['PROGNAME'])
+        self.assertIs(runner.load_subcommand('serve'), commands.ServeCommand)
+        self.assertIsNone(runner.load_subcommand('not-a-subcommand'))
+
+    def test_it_loads_subcommands_from_entry_points(self):
+        entry_point = Mock()
+        entry_point.name = 'deploy'
+        entry_point.load.return_value = Mock(return_value=Mock())
+        with patch('fugleman.runner.iter_entry_points', Mock(return_value=[entry_point])):
+            response = self.call_command('PROGNAME', 'help', '--plugins')
+            self.call_command('PROGNAME', 'deploy')
+        self.assertIn('  deploy\n', response)
+        entry_point.load.return_value.return_value.execute.assert_called_with()
+
+    def test_it_only_lists_built_in_subcommands_by_default(self):
+        iter_entry_points = Mock(return_value=[])
+        with patch('fugleman.runner.iter_entry_points', iter_entry_points):
+            response = self.call_command('PROGNAME', 'help')
+        self.assertIn('  serve\n', response)
+        self.assertFalse(iter_entry_points.called)
+
+    def test_it_does_not_import_django_or_werkzeug_for_version(self):
+        code = ("import sys; from fugleman.runner import CommandRunner; "
+                "CommandRunner(['fug', 'version']).execute(); "
+                "sys.exit(any(name.split('.')[0] in ('django', 'werkzeug') for name in sys.modules))")
+        with open(os.devnull, 'w') as devnull:
+            exit_code = subprocess.call([sys.executable, '-c', code], stdout=devnull,
+                                        env=dict(os.environ, PYTHONPATH=os.pathsep.join(sys.path)))
+        self.assertEqual(exit_code, 0)
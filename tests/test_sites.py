@@ -0,0 +1,51 @@
+from unittest import TestCase
+
+from mock import Mock
+from werkzeug.test import Client
+from werkzeug.wrappers import BaseResponse, Response
+
+from fugleman.sites import Sites
+
+
+def make_application(name):
+    def application(environ, start_response):
+        body = '%s %s %s' % (name, environ['SCRIPT_NAME'], environ['PATH_INFO'])
+        return Response(body)(environ, start_response)
+    return application
+
+
+class SitesTestCase(TestCase):
+
+    def setUp(self):
+        self.sites = Sites(
+            hosts={'Example.com': make_application('host')},
+            prefixes={'/blog/': make_application('prefix')},
+        )
+        self.client = Client(self.sites, BaseResponse)
+
+    def test_it_routes_by_host(self):
+        response = self.client.get('/about/', 'http://example.com:8000/')
+        self.assertEqual(response.data, b'host  /about/')
+
+    def test_it_routes_by_path_prefix(self):
+        response = self.client.get('/blog/post/', 'http://other.com/')
+        self.assertEqual(response.data, b'prefix /blog /post/')
+
+    def test_it_redirects_a_bare_prefix(self):
+        response = self.client.get('/blog', 'http://other.com/')
+        self.assertEqual(response.status_code, 302)
+        self.assertTrue(response.headers['Location'].endswith('/blog/'))
+
+    def test_it_returns_not_found_without_a_match(self):
+        self.assertEqual(self.client.get('/post/', 'http://other.com/').status_code, 404)
+
+    def test_it_falls_back_to_the_default(self):
+        self.sites.default = make_application('default')
+        self.assertEqual(self.client.get('/post/', 'http://other.com/').data, b'default  /post/')
+
+    def test_it_warms_up_every_application_once(self):
+        application = Mock()
+        application.warmup.return_value = (2, 0.5)
+        sites = Sites(hosts={'a.com': application, 'b.com': application}, default=Mock())
+        sites.default.warmup.return_value = (1, 0.25)
+        self.assertEqual(sites.warmup(), (3, 0.75))
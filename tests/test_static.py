@@ -0,0 +1,154 @@
+import os
+import shutil
+import tempfile
+from unittest import TestCase
+
+from werkzeug.exceptions import NotFound
+from werkzeug.test import Client
+from werkzeug.wrappers import BaseResponse, Request
+
+from fugleman.static import IMMUTABLE_CACHE_CONTROL, StaticFiles, hash_file
+
+
+class StaticFilesTestCase(TestCase):
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        os.makedirs(os.path.join(self.root, 'css'))
+        self.write(os.path.join('css', 'site.css'), b'body { color: red; }')
+        self.write(os.path.join('css', 'site.0123456789ab.css'), b'body { color: red; }')
+        self.static = StaticFiles(self.root)
+        self.client = Client(self.application, BaseResponse)
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+
+    def application(self, environ, start_response):
+        response = self.static.serve(Request(environ)) or NotFound()
+        return response(environ, start_response)
+
+    def write(self, name, content):
+        with open(os.path.join(self.root, name), 'wb') as f:
+            f.write(content)
+
+    def test_it_serves_files(self):
+        response = self.client.get('/static/css/site.css')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data, b'body { color: red; }')
+        self.assertEqual(response.headers['Content-Type'], 'text/css; charset=utf-8')
+        self.assertEqual(response.headers['Content-Length'], '20')
+
+    def test_it_does_not_serve_files_outside_the_root(self):
+        self.assertEqual(self.client.get('/static/../etc/passwd').status_code, 404)
+        self.assertEqual(self.client.get('/static/css/').status_code, 404)
+        self.assertEqual(self.client.get('/other/css/site.css').status_code, 404)
+
+    def test_it_caches_fingerprinted_files_forever(self):
+        response = self.client.get('/static/css/site.0123456789ab.css')
+        self.assertEqual(response.headers['Cache-Control'], IMMUTABLE_CACHE_CONTROL)
+        response = self.client.get('/static/css/site.css')
+        self.assertEqual(response.headers['Cache-Control'], 'no-cache')
+
+    def test_it_returns_not_modified_for_a_matching_etag(self):
+        etag = self.client.get('/static/css/site.css').headers['ETag']
+        response = self.client.get('/static/css/site.css', headers=[('If-None-Match', etag)])
+        self.assertEqual(response.status_code, 304)
+
+    def test_it_serves_byte_ranges(self):
+        response = self.client.get('/static/css/site.css', headers=[('Range', 'bytes=0-3')])
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response.data, b'body')
+        self.assertEqual(response.headers['Content-Range'], 'bytes 0-3/20')
+
+    def test_it_serves_suffix_byte_ranges(self):
+        response = self.client.get('/static/css/site.css', headers=[('Range', 'bytes=-3')])
+        self.assertEqual(response.data, b'; }')
+
+    def test_it_rejects_unsatisfiable_ranges(self):
+        response = self.client.get('/static/css/site.css', headers=[('Range', 'bytes=100-200')])
+        self.assertEqual(response.status_code, 416)
+        self.assertEqual(response.headers['Content-Range'], 'bytes */20')
+
+    def test_it_ignores_ranges_when_if_range_does_not_match(self):
+        response = self.client.get('/static/css/site.css', headers=[
+            ('Range', 'bytes=0-3'),
+            ('If-Range', '"stale"'),
+        ])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data, b'body { color: red; }')
+
+
+class AssetManifestTestCase(TestCase):
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        os.makedirs(os.path.join(self.root, 'css'))
+        self.write(os.path.join('css', 'site.css'), b'body { color: red; }')
+        self.write(os.path.join('css', 'site.0123456789ab.css'), b'body { color: red; }')
+        self.static = StaticFiles(self.root, fingerprint=True)
+        self.client = Client(self.application, BaseResponse)
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+
+    def application(self, environ, start_response):
+        response = self.static.serve(Request(environ)) or NotFound()
+        return response(environ, start_response)
+
+    def write(self, name, content):
+        with open(os.path.join(self.root, name), 'wb') as f:
+            f.write(content)
+
+    def test_it_fingerprints_files_by_their_contents(self):
+        digest = hash_file(os.path.join(self.root, 'css', 'site.css'))
+        self.assertEqual(self.static.manifest.names,
+                         {'css/site.css': 'css/site.%s.css' % digest[:12]})
+
+    def test_it_returns_fingerprinted_urls(self):
+        self.assertEqual(self.static.asset_url('css/site.css'),
+                         '/static/%s' % self.static.manifest.names['css/site.css'])
+        self.assertEqual(self.static.asset_url('js/missing.js'), '/static/js/missing.js')
+
+    def test_it_serves_fingerprinted_names_forever(self):
+        response = self.client.get(self.static.asset_url('css/site.css'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data, b'body { color: red; }')
+        self.assertEqual(response.headers['Content-Type'], 'text/css; charset=utf-8')
+        self.assertEqual(response.headers['Cache-Control'], IMMUTABLE_CACHE_CONTROL)
+
+    def test_it_updates_changed_files(self):
+        old_url = self.static.asset_url('css/site.css')
+        self.write(os.path.join('css', 'site.css'), b'body { color: blue; }')
+        self.write('app.js', b'')
+        self.static.manifest.update([os.path.join(self.root, 'css', 'site.css'),
+                                     os.path.join(self.root, 'app.js')])
+        self.assertNotEqual(self.static.asset_url('css/site.css'), old_url)
+        self.assertIn('app.js', self.static.manifest.names)
+
+    def test_it_serves_old_fingerprints_without_caching_them_forever(self):
+        old_url = self.static.asset_url('css/site.css')
+        self.write(os.path.join('css', 'site.css'), b'body { color: blue; }')
+        # Before anything tells the manifest the file changed.
+        response = self.client.get(old_url)
+        self.assertEqual(response.data, b'body { color: blue; }')
+        self.assertEqual(response.headers['Cache-Control'], 'no-cache')
+        # Serving it leaves the change for the watcher or poll to find.
+        self.assertEqual(self.static.asset_url('css/site.css'), old_url)
+        self.assertTrue(self.static.manifest.poll(interval=0))
+        new_url = self.static.asset_url('css/site.css')
+        self.assertNotEqual(new_url, old_url)
+        self.assertEqual(self.client.get(new_url).headers['Cache-Control'], IMMUTABLE_CACHE_CONTROL)
+
+    def test_it_polls_for_changes(self):
+        self.assertFalse(self.static.manifest.poll(interval=0))
+        self.write('app.js', b'')
+        self.assertTrue(self.static.manifest.poll(interval=0))
+        self.assertIn('app.js', self.static.manifest.names)
+        self.write('other.js', b'')
+        self.assertFalse(self.static.manifest.poll(interval=60))
+
+    def test_it_forgets_removed_files(self):
+        filename = os.path.join(self.root, 'css', 'site.css')
+        os.remove(filename)
+        self.static.manifest.update([filename])
+        self.assertEqual(self.static.manifest.names, {})
@@ -0,0 +1,41 @@
+from unittest import TestCase
+
+from fugleman.cache import PageCache
+from fugleman.stats import Stats, Timings
+
+
+class TimingsTestCase(TestCase):
+
+    def test_it_accumulates_phases(self):
+        timings = Timings()
+        timings.mark('resolve')
+        timings.mark('render')
+        timings.mark('resolve')
+        self.assertEqual(sorted(timings.phases), ['render', 'resolve'])
+        self.assertAlmostEqual(sum(timings.phases.values()), timings.total)
+
+    def test_it_formats_a_server_timing_header(self):
+        timings = Timings()
+        timings.phases = {'render': 0.0125, 'parse': 0.001}
+        self.assertEqual(timings.server_timing(), 'parse;dur=1.000, render;dur=12.500')
+
+
+class StatsTestCase(TestCase):
+
+    def setUp(self):
+        self.stats = Stats()
+        timings = Timings()
+        timings.phases = {'render': 0.003}
+        timings.last = timings.start + 0.004
+        self.stats.record(timings)
+
+    def test_it_renders_cumulative_histogram_buckets(self):
+        text = self.stats.render()
+        self.assertIn('fugleman_request_phase_seconds_bucket{phase="render",le="0.0025"} 0\n', text)
+        self.assertIn('fugleman_request_phase_seconds_bucket{phase="render",le="0.005"} 1\n', text)
+        self.assertIn('fugleman_request_phase_seconds_bucket{phase="render",le="+Inf"} 1\n', text)
+        self.assertIn('fugleman_request_phase_seconds_count{phase="total"} 1\n', text)
+        self.assertIn('fugleman_request_phase_seconds_count{phase="parse"} 0\n', text)
+
+    def test_it_renders_cache_counters(self):
+        self.assertIn('fugleman_page_cache_hits 0\n', self.stats.render(PageCache()))
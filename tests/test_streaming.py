@@ -0,0 +1,45 @@
+from unittest import TestCase
+
+from django.template import Context, Template
+
+from fugleman import streaming
+from tests.test_application import get_application
+
+
+class StreamingTestCase(TestCase):
+
+    def setUp(self):
+        # Templates can only be compiled once settings are configured.
+        get_application()
+
+    def render(self, source, **context):
+        template = Template(source)
+        chunks = list(streaming.iter_render(template, Context(context)))
+        self.assertEqual(u''.join(chunks), template.render(Context(context)))
+        return chunks
+
+    def test_it_renders_templates(self):
+        self.render('Hello {{ name }}', name='World')
+
+    def test_it_yields_each_pass_through_a_loop(self):
+        chunks = self.render('{% for i in items %}<li>{{ i }}</li>{% endfor %}', items=range(3))
+        self.assertEqual(len(chunks), 9)
+
+    def test_it_renders_empty_loops(self):
+        self.render('{% for i in items %}{{ i }}{% empty %}None{% endfor %}', items=[])
+
+    def test_it_renders_loop_variables(self):
+        self.render('{% for a, b in items %}{{ forloop.counter }}{{ a }}{{ b }}{% endfor %}',
+                    items=[(1, 2), (3, 4)])
+
+    def test_it_renders_blocks(self):
+        self.render('{% block title %}Title{% endblock %}')
+
+    def test_it_renders_extended_templates(self):
+        parent = Template('<h1>{% block title %}Parent{% endblock %}</h1>')
+        self.render('{% extends parent %}{% block title %}{{ block.super }} Child{% endblock %}',
+                    parent=parent)
+
+    def test_it_encodes_chunks(self):
+        chunks = list(streaming.iter_encoded([u'ab', u'c', u'\xe9'], chunk_size=2))
+        self.assertEqual(chunks, [b'ab', b'c\xc3\xa9'])
@@ -0,0 +1,101 @@
+import os
+import shutil
+import tempfile
+from unittest import TestCase
+
+from fugleman import templates
+
+
+class TemplatesTestCase(TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.write('base.html', '{% block content %}{% endblock %}{% include "nav.html" %}')
+        self.write('nav.html', '<nav></nav>')
+        self.write('index.html', "{% extends 'base.html' %}{% include name %}")
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def write(self, name, source):
+        filename = os.path.join(self.tmpdir, name)
+        if not os.path.isdir(os.path.dirname(filename)):
+            os.makedirs(os.path.dirname(filename))
+        with open(filename, 'w') as f:
+            f.write(source)
+        return filename
+
+    def test_it_finds_templates_in_the_first_matching_dir(self):
+        other = tempfile.mkdtemp()
+        try:
+            self.assertEqual(
+                templates.find_template('nav.html', [other, self.tmpdir]),
+                os.path.join(self.tmpdir, 'nav.html'),
+            )
+            self.assertIsNone(templates.find_template('missing.html', [other]))
+        finally:
+            shutil.rmtree(other)
+
+    def test_it_parses_constant_extends_and_includes(self):
+        self.assertEqual(
+            templates.parse_dependencies('{% extends "a.html" %}{% include \'b.html\' %}{% include c %}'),
+            ['a.html', 'b.html'],
+        )
+
+    def test_it_follows_dependency_chains(self):
+        dependencies = templates.find_dependencies('index.html', [self.tmpdir])
+        self.assertEqual(sorted(dependencies), [
+            os.path.join(self.tmpdir, 'base.html'),
+            os.path.join(self.tmpdir, 'index.html'),
+            os.path.join(self.tmpdir, 'nav.html'),
+        ])
+
+    def test_it_maps_template_names_to_request_paths(self):
+        self.assertEqual(templates.template_path('index.html'), '/')
+        self.assertEqual(templates.template_path('about.html'), '/about/')
+        self.assertEqual(templates.template_path(os.path.join('about', 'index.html')), '/about/')
+        self.assertEqual(templates.template_path(os.path.join('blog', 'post.html')), '/blog/post/')
+
+    def test_it_finds_every_servable_path(self):
+        self.write(os.path.join('blog', 'index.html'), '')
+        self.write('blog.html', '')
+        self.write('notes.txt', '')
+        self.assertEqual(templates.find_paths([self.tmpdir]), ['/', '/base/', '/blog/', '/nav/'])
+
+    def test_it_routes_paths_to_templates(self):
+        self.write(os.path.join('blog', 'index.html'), '')
+        routes = templates.find_routes([self.tmpdir])
+        self.assertEqual(routes['/'], ('index.html', os.path.join(self.tmpdir, 'index.html')))
+        self.assertEqual(routes['/index/'][0], 'index.html')
+        self.assertEqual(routes['/blog/'][0], 'blog/index.html')
+        self.assertNotIn('/blog/index.html', routes)
+
+    def test_it_prefers_named_templates_over_index_templates(self):
+        self.write(os.path.join('blog', 'index.html'), '')
+        self.write('blog.html', '')
+        self.assertEqual(templates.find_routes([self.tmpdir])['/blog/'][0], 'blog.html')
+
+    def test_it_prefers_templates_in_earlier_dirs(self):
+        other = tempfile.mkdtemp()
+        try:
+            with open(os.path.join(other, 'nav.html'), 'w') as f:
+                f.write('')
+            routes = templates.find_routes([other, self.tmpdir])
+            self.assertEqual(routes['/nav/'][1], os.path.join(other, 'nav.html'))
+        finally:
+            shutil.rmtree(other)
+
+    def test_the_route_index_can_be_refreshed(self):
+        index = templates.RouteIndex([self.tmpdir])
+        self.assertNotIn('/new/', index)
+        self.write('new.html', '')
+        index.refresh()
+        self.assertIn('/new/', index)
+
+    def test_the_route_index_can_be_polled(self):
+        index = templates.RouteIndex([self.tmpdir])
+        self.write('new.html', '')
+        self.assertFalse(index.poll(interval=60))
+        self.assertNotIn('/new/', index)
+        self.assertTrue(index.poll(interval=0))
+        self.assertIn('/new/', index)
@@ -0,0 +1,63 @@
+from unittest import TestCase
+
+from django.template import Context, Template, TemplateSyntaxError
+from mock import Mock
+
+from fugleman.engine import Engine
+from tests.test_application import get_application
+
+
+class FugCacheTagTestCase(TestCase):
+
+    def setUp(self):
+        # Templates can only be compiled once settings are configured.
+        get_application()
+        self.engine = Engine([])
+
+    def render(self, template, **context):
+        with self.engine.activated():
+            return template.render(Context(context))
+
+    def test_it_caches_fragments(self):
+        template = Template('{% load fugleman %}{% fugcache nav 0 %}{{ value }}{% endfugcache %}')
+        self.assertEqual(self.render(template, value='first'), 'first')
+        self.assertEqual(self.render(template, value='second'), 'first')
+
+    def test_it_caches_a_fragment_for_each_vary_on_value(self):
+        template = Template('{% load fugleman %}{% fugcache nav 0 page %}{{ value }}{% endfugcache %}')
+        self.assertEqual(self.render(template, page=1, value='first'), 'first')
+        self.assertEqual(self.render(template, page=2, value='second'), 'second')
+        self.assertEqual(self.render(template, page=1, value='third'), 'first')
+
+    def test_it_doesnt_share_fragments_between_compiled_templates(self):
+        source = '{% load fugleman %}{% fugcache nav 0 %}{{ value }}{% endfugcache %}'
+        self.render(Template(source), value='first')
+        self.assertEqual(self.render(Template(source), value='second'), 'second')
+
+    def test_it_renders_without_an_engine(self):
+        template = Template('{% load fugleman %}{% fugcache nav 0 %}{{ value }}{% endfugcache %}')
+        self.assertEqual(template.render(Context({'value': 'first'})), 'first')
+
+    def test_it_requires_a_name_and_timeout(self):
+        self.assertRaises(TemplateSyntaxError, Template,
+                          '{% load fugleman %}{% fugcache nav %}{% endfugcache %}')
+
+
+class AssetTagTestCase(TestCase):
+
+    def setUp(self):
+        get_application()
+        self.static = Mock()
+        self.static.asset_url = Mock(side_effect=lambda name: '/static/%s' % name.replace('.', '.abc.'))
+        self.engine = Engine([], static=self.static)
+
+    def test_it_links_to_fingerprinted_files(self):
+        template = Template('{% load fugleman %}{% asset "site.css" %}')
+        with self.engine.activated():
+            self.assertEqual(template.render(Context()), '/static/site.abc.css')
+
+    def test_it_returns_the_name_without_static_files(self):
+        template = Template('{% load fugleman %}{% asset "site.css" %}')
+        self.assertEqual(template.render(Context()), 'site.css')
+        with Engine([]).activated():
+            self.assertEqual(template.render(Context()), 'site.css')
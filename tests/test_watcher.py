@@ -0,0 +1,80 @@
+import os
+import shutil
+import tempfile
+from unittest import TestCase
+
+from mock import Mock, patch
+
+from fugleman.watcher import InotifyWatcher, Watcher, create_watcher
+
+
+class WatcherTestCase(TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.filename = os.path.join(self.tmpdir, 'index.html')
+        self.write(self.filename)
+        self.watcher = Watcher([self.tmpdir], Mock())
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def write(self, filename):
+        with open(filename, 'w') as f:
+            f.write('')
+
+    def test_it_reports_nothing_when_nothing_changed(self):
+        self.assertEqual(self.watcher.poll(), set())
+
+    def test_it_reports_added_files(self):
+        filename = os.path.join(self.tmpdir, 'new.html')
+        self.write(filename)
+        self.assertEqual(self.watcher.poll(), set([filename]))
+
+    def test_it_reports_changed_files(self):
+        mtime = os.path.getmtime(self.filename)
+        os.utime(self.filename, (mtime + 10, mtime + 10))
+        self.assertEqual(self.watcher.poll(), set([self.filename]))
+
+    def test_it_reports_removed_files(self):
+        os.remove(self.filename)
+        self.assertEqual(self.watcher.poll(), set([self.filename]))
+        self.assertEqual(self.watcher.poll(), set())
+
+    def test_it_keeps_watching_when_the_callback_fails(self):
+        self.watcher.callback.side_effect = OSError()
+        with patch('traceback.print_exc') as print_exc:
+            self.watcher.notify(set([self.filename]))
+        self.assertTrue(print_exc.called)
+
+
+class InotifyWatcherTestCase(WatcherTestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.filename = os.path.join(self.tmpdir, 'index.html')
+        self.write(self.filename)
+        try:
+            self.watcher = InotifyWatcher([self.tmpdir], Mock())
+        except OSError:
+            shutil.rmtree(self.tmpdir)
+            self.skipTest("inotify isn't available")
+
+    def tearDown(self):
+        self.watcher.close()
+        shutil.rmtree(self.tmpdir)
+
+    def test_it_watches_new_directories(self):
+        dirname = os.path.join(self.tmpdir, 'blog')
+        os.mkdir(dirname)
+        self.assertEqual(self.watcher.poll(), set([dirname]))
+        filename = os.path.join(dirname, 'post.html')
+        self.write(filename)
+        self.assertEqual(self.watcher.poll(), set([filename]))
+
+
+class CreateWatcherTestCase(TestCase):
+
+    def test_it_falls_back_to_polling(self):
+        with patch('fugleman.watcher.InotifyWatcher', Mock(side_effect=OSError)):
+            self.assertEqual(type(create_watcher([], Mock())), Watcher)